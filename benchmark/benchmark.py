@@ -10,6 +10,8 @@ import psutil
 
 from src.model import Model
 from src.explainer import ExplanationProgram
+from src.simplify import simplify_model
+from src.compiled import compile_model
 
 logging.basicConfig(
     stream=sys.stdout,
@@ -23,14 +25,14 @@ SEED = 21023
 def random_x(lims):
     return [random.uniform(l[0], l[1]) for l in lims.values()]
 
-def benchmark_enumerate(name, seed=SEED):
+def benchmark_enumerate(name, seed=SEED, simplify=False):
     random.seed(seed)
     logging.info(f"Benchmarking model {name} enumeration...")
-    with open(f"models/{name}.json", "r") as fd:
-        model = json.load(fd)
-    model = Model(model)
+    model = get_model(name)
     
     lims = get_lims(f"models/{name}.lims")
+    if simplify:
+        simplify_model(model, lims)
     logging.info(f"successfully initialised domain limits models/{name}.lims")
 
     program = ExplanationProgram(model, limits=lims)
@@ -42,14 +44,14 @@ def benchmark_enumerate(name, seed=SEED):
             f.flush()
     logging.info(f"Benchmark complete")
 
-def benchmark_explain(name, seed=SEED):
+def benchmark_explain(name, seed=SEED, simplify=False):
     random.seed(seed)
     logging.info(f"Benchmarking model {name} individual explanations...")
-    with open(f"models/{name}.json", "r") as fd:
-        model = json.load(fd)
-    model = Model(model)
+    model = get_model(name)
     
     lims = get_lims(f"models/{name}.lims")
+    if simplify:
+        simplify_model(model, lims)
     logging.info(f"successfully initialised domain limits models/{name}.lims")
 
     program = ExplanationProgram(model, limits=lims)
@@ -65,17 +67,41 @@ def benchmark_explain(name, seed=SEED):
                 logging.info(f"Benchmark {100*round(i/N, 2)}% ({i}/{N}) complete...")
     logging.info(f"Benchmark complete")
 
-def benchmark(name, seed_gen, seed=SEED):
+def benchmark_multiclass(name, modes=("loop", "disjunctive", "ordered"), N=20, seed=SEED, simplify=False):
+    """Compare multiclass entailment modes on the same explain() instances."""
+    logging.info(f"Benchmarking model {name} multiclass modes {modes}...")
+    model = get_model(name)
+    lims = get_lims(f"models/{name}.lims")
+    if simplify:
+        simplify_model(model, lims)
+
+    with open(f"data/{name}_multiclass.csv", "w") as f:
+        f.write("mode,time_taken,solver_calls\n")
+        for mode in modes:
+            random.seed(seed)
+            program = ExplanationProgram(model, limits=lims, multiclass=mode)
+            total_t = 0
+            for i in range(N):
+                x = random_x(lims)
+                program.explain(x)
+                f.write(f"{mode},{program._explain_t},{program._sat_calls}\n")
+                total_t += program._explain_t
+                program.entailer.reset()
+            logging.info(f"{mode}: {total_t:.3f}s over {N} explanations")
+    logging.info(f"Benchmark complete")
+
+def benchmark(name, seed_gen, seed=SEED, simplify=False):
     random.seed(seed)
     logging.info(f"Benchmarking model {name} seed_gen {seed_gen}")
-    with open(f"models/{name}.json", "r") as fd:
-        model = json.load(fd)
-    model = Model(model)
-    
     lims = get_lims(f"models/{name}.lims")
     logging.info(f"successfully initialised domain limits models/{name}.lims")
+    # the benchmark models ship with the repository, so their artifacts are trusted
+    compiled = compile_model(
+        get_model_path(name), lims, seed_gens=(seed_gen,), simplify=simplify, cache=True
+    )
+    model = compiled.model
 
-    program = ExplanationProgram(model, limits=lims, seed_gen=seed_gen)
+    program = ExplanationProgram(model, limits=lims, seed_gen=seed_gen, compiled=compiled)
     x = random_x(lims)
     with open(f"data/{name}_{seed_gen}.csv", "w") as f:
         f.write("seed_gen_t,lattice_traversal_t,total_t,cum_solver_calls,cum_entailing,cum_nonentailing,seed_entailing,seed_score,max_score,rss_bytes,vms_bytes\n")
@@ -90,16 +116,30 @@ def benchmark(name, seed_gen, seed=SEED):
         f.flush()
     logging.info(f"Benchmark complete")
 
-def benchmark_multiprocess(models, seed_gen, seed=SEED):
+def benchmark_multiprocess(models, seed_gen, seed=SEED, simplify=False):
     with Pool() as pool:
-        results = [pool.apply_async(benchmark, (model, seed_gen, seed)) for model in models]
+        results = [
+            pool.apply_async(benchmark, (model, seed_gen, seed, simplify)) for model in models
+        ]
         try:
             [res.wait(timeout=21600) for res in results]
         except TimeoutError:
             pass
 
 def get_models(model_dir="models"):
-    return set(map(lambda x: x.split(".")[0], os.listdir(model_dir)))
+    return set(
+        f.split(".")[0] for f in os.listdir(model_dir) if not f.endswith(".compiled")
+    )
+
+def get_model_path(name, model_dir="models"):
+    """Path of <name>.ubj in model_dir if present, otherwise <name>.json."""
+    path = os.path.join(model_dir, f"{name}.ubj")
+    if not os.path.exists(path):
+        path = os.path.join(model_dir, f"{name}.json")
+    return path
+
+def get_model(name, model_dir="models"):
+    return Model.load(get_model_path(name, model_dir))
 
 def get_lims(fname):
     lims = {}
@@ -111,6 +151,7 @@ def get_lims(fname):
             line = f.readline()
     return lims
 
-def benchmark_all(seed_gen, seed=SEED):
+def benchmark_all(seed_gen, seed=SEED, simplify=False):
+    """Benchmark every model; simplify prunes them first, like --simplify."""
     models = sorted(get_models())
-    benchmark_multiprocess(models, seed_gen, seed)
+    benchmark_multiprocess(models, seed_gen, seed, simplify)
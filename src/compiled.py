@@ -0,0 +1,136 @@
+import os
+import pickle
+import hashlib
+import logging
+
+from .model import Model
+from .regions import FeatureSpaceInfo
+from .simplify import simplify_model
+from .entailment.z3_entailer import EntailmentChecker as Z3EntailmentChecker
+from .generators.rc2_generator import SeedGenerator as Rc2Generator
+from .generators.rc2stratified_generator import SeedGenerator as StratifiedRc2Generator
+
+# Bump when the layout of any cached object changes
+ARTIFACT_VERSION = 3
+
+# Seed generators whose initial formula can be cached
+CNF_GENERATORS = {
+    "maxsat": Rc2Generator,
+    "maxstrat": StratifiedRc2Generator,
+}
+
+
+class CompiledModel:
+    """
+    A model together with everything built from it before the first
+    query: its leaf index, the SMT-LIB2 ensemble encoding and the initial
+    formula of the seed generators, plus the feature space over limits.
+
+    Optionally stored next to the model file and keyed by a hash of the
+    file, the domain limits and the artifact version, so that later runs
+    load it instead of building it again. The file is a pickle, so loading
+    it runs whatever code it holds: only cache into directories whose
+    files are trusted. Uncached, it holds no encodings (smt2 is None) and
+    everything else is built as without it.
+    """
+    def __init__(self, key: str, model: Model, limits, smt2: str):
+        self.key = key
+        self.model = model
+        self.limits = limits
+        self.fs_info = FeatureSpaceInfo(model.thresholds, limits=limits)
+        self.smt2 = smt2
+        # pickled, so every generator gets its own copy of the formula
+        self.generators = {}
+
+    def __getstate__(self):
+        # the feature space is cheap to rebuild and holds dict views
+        state = dict(self.__dict__)
+        del state["fs_info"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.fs_info = FeatureSpaceInfo(self.model.thresholds, limits=self.limits)
+
+    def cnf_state(self, seed_gen):
+        """Initial formula of seed_gen for its cnf_state option, or None."""
+        if seed_gen not in self.generators:
+            return None
+        return pickle.loads(self.generators[seed_gen])
+
+    def add_generator(self, seed_gen):
+        """Build and keep the initial formula of seed_gen."""
+        generator = CNF_GENERATORS[seed_gen](self.fs_info)
+        self.generators[seed_gen] = pickle.dumps(generator.cnf_state())
+
+    def save(self, path):
+        # write then rename, so concurrent workers never read half a file
+        tmp = "%s.%d.tmp" % (path, os.getpid())
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+
+def artifact_key(model_path, limits=None, simplify=False):
+    h = hashlib.sha256()
+    with open(model_path, "rb") as f:
+        h.update(f.read())
+    h.update(repr((ARTIFACT_VERSION, sorted((limits or {}).items()), simplify)).encode())
+    return h.hexdigest()
+
+
+def artifact_path(model_path):
+    return os.path.splitext(model_path)[0] + ".compiled"
+
+
+def _load_model(model_path, limits, simplify):
+    model = Model.load(model_path)
+    if simplify:
+        simplify_model(model, limits)
+    model.build_leaf_index()
+    return model
+
+
+def compile_model(model_path, limits=None, seed_gens=("maxsat",), simplify=False, cache=False):
+    """
+    CompiledModel of the model file at model_path with domain limits.
+
+    simplify: prune the model to the domain limits with simplify_model.
+
+    cache: load it from its artifact at artifact_path(model_path) when one
+        with a matching key exists, and save it there otherwise, adding
+        missing seed generator formulas. The artifact is unpickled, so it
+        must be trusted as much as the code itself. Without cache nothing
+        is read or written, and only the model and its leaf index are
+        built: the encodings would just be thrown away again.
+    """
+    if not cache:
+        return CompiledModel(None, _load_model(model_path, limits, simplify), limits, None)
+    key = artifact_key(model_path, limits, simplify)
+    path = artifact_path(model_path)
+    compiled = None
+    if os.path.exists(path):
+        try:
+            with open(path, "rb") as f:
+                compiled = pickle.load(f)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+            logging.info(f"ignoring unreadable artifact {path}: {e}")
+        if compiled is not None and getattr(compiled, "key", None) != key:
+            compiled = None
+    changed = compiled is None
+    if compiled is None:
+        logging.info(f"compiling {model_path}")
+        model = _load_model(model_path, limits, simplify)
+        smt2 = Z3EntailmentChecker(model, incremental=False).encoding_smt2()
+        compiled = CompiledModel(key, model, limits, smt2)
+    for seed_gen in seed_gens:
+        if seed_gen in CNF_GENERATORS and seed_gen not in compiled.generators:
+            compiled.add_generator(seed_gen)
+            changed = True
+    if changed:
+        compiled.save(path)
+    return compiled
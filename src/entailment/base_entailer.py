@@ -0,0 +1,228 @@
+import numpy as np
+
+from ..model import Model
+from ..predictor import EnsemblePredictor
+from ..regions import Region
+from .entailment_cache import EntailmentCache
+from .counterexample_pool import CounterexamplePool
+
+
+class BaseEntailmentChecker:
+    """
+    Shared front end of the entailment backends.
+
+    Subclasses encode the ensemble and implement
+    _exists_counterexample(r, key), where key is (out,) for binary
+    objectives and (out, grp, ...) for multiclass objectives. A multiclass
+    counterexample is an instance where any of the listed competing
+    classes has a larger margin than out.
+    """
+    _no_parent = 2147483647
+    _multiclass_modes = ["loop", "disjunctive", "ordered"]
+    def __init__(
+            self, 
+            model: Model, 
+            prefilter=True, 
+            cache_size=1024, 
+            pool=True, 
+            multiclass="loop"
+        ):
+        """
+        prefilter: before calling the solver, bound each class margin over
+            the region by the extreme leaf weights each tree can reach in
+            it, and skip the solver whenever those bounds settle the query.
+        cache_size: number of positive and of negative answers kept per
+            class for answering queries implied by earlier ones. 0 disables
+            the cache.
+        pool: keep every counterexample the solver finds and reject later
+            regions that contain one of them without calling the solver.
+        multiclass: how competing classes are checked on multiclass models.
+            "loop" asks one query per competing class, "disjunctive" asks a
+            single query for any competing class, and "ordered" loops over
+            competing classes by decreasing margin at the instance given to
+            set_instance, so that likely counterexamples are found first.
+        """
+        if multiclass not in self._multiclass_modes:
+            raise ValueError(f"{multiclass} not a valid multiclass mode")
+        self.model = model
+        self.groups = sorted(set(self.model.tree_info))
+        self.used_features = model.thresholds.keys()
+        self.cexample = None
+        self.core = None
+        self.last_core = None
+        self.oracle_calls = 0
+        self.prefilter = prefilter
+        self.prefilter_calls = 0
+        self.prefilter_hits = 0
+        self.multiclass = multiclass
+        self.class_order = self.groups
+        self.predictor = EnsemblePredictor(model)
+        self.cache = EntailmentCache(model.leaf_index, cache_size) if cache_size else None
+        self.pool = CounterexamplePool(
+            model.num_feature, self.predictor.num_groups, self.predictor.margin_tol
+        ) if pool else None
+
+    def predict(self, x: list[float], ws=None):
+        if ws is None:
+            ws = self._get_weights(x)
+        elif not type(ws) == list:
+            ws = list(ws)
+
+        objective = self.model.objective
+        if objective == "binary:logistic":
+            return 0 if ws[0] < 0 else 1
+        elif objective == "multi:softprob" or objective == "multi:softmax":
+            return ws.index(max(ws))
+
+    def entails(self, r: Region, out):
+        """
+        Whether every instance of r is predicted out. On a positive answer
+        self.core is the set of (f_id, side) bounds of r that the proof
+        used, or None if the cache or the margin bounds gave the answer or
+        the backend cannot tell.
+        """
+        objective = self.model.objective
+        if out not in self.groups and "multi" in objective:
+            raise ValueError(f"{out} not in valid classes {self.groups}")
+
+        keys = self._objective_keys(out)
+        self.core = None
+        if self.cache is not None:
+            cached = self.cache.lookup(r, out)
+            if cached is not None:
+                entails, witness = cached
+                if not entails:
+                    self.cexample = witness
+                return entails
+            entails = self._entails(r, keys)
+            self.cache.insert(r, out, entails, None if entails else self.cexample)
+            return entails
+        return self._entails(r, keys)
+
+    def bounds_refute(self, r: Region, out):
+        """
+        True if the margin bounds alone show that every instance of r is a
+        counterexample to out. Never calls the solver.
+        """
+        lower, upper = self._region_arrays(r)
+        bounds = self.predictor.margin_bounds(lower, upper)
+        return any(self._bounds_decide(key, bounds) for key in self._objective_keys(out))
+
+    def _objective_keys(self, out):
+        objective = self.model.objective
+        if objective == "binary:logistic":
+            return [(out,)]
+        elif objective == "multi:softprob" or objective == "multi:softmax":
+            if self.multiclass == "ordered":
+                grps = [grp for grp in self.class_order if grp != out]
+            else:
+                grps = [grp for grp in self.groups if grp != out]
+            if self.multiclass == "disjunctive":
+                return [(out, *grps)]
+            return [(out, grp) for grp in grps]
+        raise NotImplementedError(f"objective {objective} not implemented")
+
+    def _entails(self, r: Region, keys):
+        lower, upper = self._region_arrays(r)
+        if self.pool is not None:
+            witness = self.pool.find(lower, upper, keys)
+            if witness is not None:
+                self.cexample = witness
+                return False
+        bounds = None
+        if self.prefilter:
+            bounds = self.predictor.margin_bounds(lower, upper)
+        core = set()
+        for key in keys:
+            if bounds is not None:
+                self.prefilter_calls += 1
+                decided = self._bounds_decide(key, bounds)
+                if decided is not None:
+                    self.prefilter_hits += 1
+                    if decided:
+                        self.cexample = self._region_point(r)
+                        return False
+                    core = None
+                    continue
+            if self._exists_counterexample(r, key):
+                if self.pool is not None:
+                    self.pool.add(self.cexample, self.predictor.margins(self.cexample))
+                return False
+            if core is not None and self.last_core is not None:
+                core |= self.last_core
+            else:
+                core = None
+        self.core = core
+        return True
+
+    def set_instance(self, x: list[float]):
+        """Order competing classes by decreasing margin at x."""
+        ws = self._get_weights(x)
+        self.class_order = sorted(self.groups, key=lambda grp: -ws[grp])
+
+    def reset(self):
+        self.cexample = None
+        self.oracle_calls = 0
+        self.prefilter_calls = 0
+        self.prefilter_hits = 0
+        if self.cache is not None:
+            self.cache.reset_stats()
+        if self.pool is not None:
+            self.pool.hits = 0
+
+    def _get_weights(self, x: list[float]):
+        """Per-group margins of x, evaluated without calling the solver."""
+        return self.predictor.margins(x).tolist()
+
+    def _region_arrays(self, r: Region):
+        """Per-feature lower and upper bounds of r, infinite where unbounded."""
+        lower = np.full(self.model.num_feature, -np.inf)
+        upper = np.full(self.model.num_feature, np.inf)
+        for f_id, (l, u) in r.bounds.items():
+            lower[f_id] = l
+            upper[f_id] = u
+        return lower, upper
+
+    def _bounds_decide(self, key, bounds):
+        """
+        Whether the margin bounds alone show that every instance of the
+        region is a counterexample to key (True) or that none is (False).
+        Returns None when the solver is needed.
+
+        A counterexample to key has a negative margin difference d, which is
+        -w for (0,), w for (1,), and w_out - w_grp for (out, grp). With
+        several competing classes it is the smallest such difference.
+        """
+        lo, hi = bounds
+        if len(key) == 1:
+            d_min, d_max = (-hi[0], -lo[0]) if key[0] == 0 else (lo[0], hi[0])
+        else:
+            out, grps = key[0], list(key[1:])
+            d_min = lo[out] - np.max(hi[grps])
+            d_max = hi[out] - np.max(lo[grps])
+        tol = self.predictor.margin_tol
+        if d_min > tol:
+            return False
+        if d_max < -tol:
+            return True
+        return None
+
+    def _region_point(self, r: Region):
+        """An instance inside r, used as the witness of a decided query."""
+        x = []
+        for f_id in range(self.model.num_feature):
+            if f_id in r.bounds.keys():
+                x.append(r.bounds[f_id][0])
+            elif f_id in self.model.thresholds.keys():
+                x.append(self.model.thresholds[f_id][0] - 1)
+            else:
+                x.append(None)
+        return x
+
+    def _exists_counterexample(self, r: Region, key):
+        """
+        Whether r holds a counterexample to key, stored in self.cexample.
+        When there is none, self.last_core is the set of (f_id, side)
+        bounds of r needed to show it, or None if unknown.
+        """
+        raise NotImplementedError()
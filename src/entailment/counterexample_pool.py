@@ -0,0 +1,64 @@
+import numpy as np
+
+
+class CounterexamplePool:
+    """
+    Growable store of counterexamples found by the solver, together with
+    their class margins, so that regions holding a known counterexample are
+    rejected without another solver call.
+    """
+    def __init__(self, num_feature: int, num_groups: int, tol=0.0):
+        self.num_feature = num_feature
+        self.num_groups = num_groups
+        self.tol = tol
+        self.capacity = 20
+        self.size = 0
+        self.points = np.full((self.capacity, num_feature), np.nan, dtype=np.float64)
+        self.margins = np.zeros((self.capacity, num_groups), dtype=np.float64)
+        self.hits = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, x, ws):
+        """Store instance x (None for missing values) with margins ws."""
+        if self.size == self.capacity:
+            self.capacity *= 4
+            points = np.full((self.capacity, self.num_feature), np.nan, dtype=np.float64)
+            points[:self.size] = self.points[:self.size]
+            margins = np.zeros((self.capacity, self.num_groups), dtype=np.float64)
+            margins[:self.size] = self.margins[:self.size]
+            self.points, self.margins = points, margins
+        self.points[self.size] = np.array(x, dtype=np.float64)
+        self.margins[self.size] = ws
+        self.size += 1
+
+    def find(self, lower, upper, keys):
+        """
+        A stored point with lower <= x < upper that is a counterexample to
+        one of the objective keys, or None.
+
+        keys follow the entailers: (out,) for binary objectives and
+        (out, grp, ...) for multiclass objectives.
+        """
+        if self.size == 0:
+            return None
+        points = self.points[:self.size]
+        ws = self.margins[:self.size]
+        free = np.isneginf(lower) & np.isposinf(upper)
+        inside = np.all((points >= lower) & (points < upper) | free, axis=1)
+        if not inside.any():
+            return None
+        witness = np.zeros(self.size, dtype=bool)
+        for key in keys:
+            if len(key) == 1:
+                diff = -ws[:, 0] if key[0] == 0 else ws[:, 0]
+            else:
+                diff = ws[:, key[0]] - np.max(ws[:, list(key[1:])], axis=1)
+            witness |= diff < -self.tol
+        found = np.flatnonzero(inside & witness)
+        if len(found) == 0:
+            return None
+        self.hits += 1
+        x = points[found[0]]
+        return [None if np.isnan(v) else float(v) for v in x]
@@ -0,0 +1,151 @@
+import bisect
+
+import numpy as np
+
+from ..leaf_index import LeafIndex
+from ..regions import Region
+
+
+class BoxTable:
+    """
+    Fixed-capacity table of integer boxes with least recently used eviction.
+    """
+    def __init__(self, n_features: int, max_size: int):
+        self.max_size = max_size
+        self.lows = np.zeros((max_size, n_features), dtype=np.int32)
+        self.highs = np.zeros((max_size, n_features), dtype=np.int32)
+        self.used = np.zeros(max_size, dtype=bool)
+        self.stamps = np.zeros(max_size, dtype=np.int64)
+        self.witnesses = [None for _ in range(max_size)]
+        self.slots = {}
+
+    def __len__(self):
+        return len(self.slots)
+
+    def find_superset(self, lo, hi):
+        """Slot of a stored box containing lo..hi, or None."""
+        mask = self.used & np.all(self.lows <= lo, axis=1) & np.all(self.highs >= hi, axis=1)
+        return self._first(mask)
+
+    def find_subset(self, lo, hi):
+        """Slot of a stored box contained in lo..hi, or None."""
+        mask = self.used & np.all(self.lows >= lo, axis=1) & np.all(self.highs <= hi, axis=1)
+        return self._first(mask)
+
+    def insert(self, key, lo, hi, stamp, witness=None, subsumes="subsets"):
+        """
+        Store a box, dropping the stored boxes it makes redundant: its
+        subsets for positive answers and its supersets for negative ones.
+        """
+        if key in self.slots:
+            self.stamps[self.slots[key]] = stamp
+            return
+        if subsumes == "subsets":
+            redundant = np.all(self.lows >= lo, axis=1) & np.all(self.highs <= hi, axis=1)
+        else:
+            redundant = np.all(self.lows <= lo, axis=1) & np.all(self.highs >= hi, axis=1)
+        for slot in np.flatnonzero(self.used & redundant):
+            self._free(slot)
+
+        if len(self.slots) < self.max_size:
+            slot = int(np.argmin(self.used))
+        else:
+            slot = int(np.argmin(np.where(self.used, self.stamps, np.iinfo(np.int64).max)))
+            self._free(slot)
+        self.lows[slot] = lo
+        self.highs[slot] = hi
+        self.used[slot] = True
+        self.stamps[slot] = stamp
+        self.witnesses[slot] = witness
+        self.slots[key] = slot
+
+    def touch(self, slot, stamp):
+        self.stamps[slot] = stamp
+
+    def _free(self, slot):
+        key = (tuple(self.lows[slot]), tuple(self.highs[slot]))
+        del self.slots[key]
+        self.used[slot] = False
+        self.witnesses[slot] = None
+
+    def _first(self, mask):
+        slots = np.flatnonzero(mask)
+        return int(slots[0]) if len(slots) else None
+
+
+class EntailmentCache:
+    """
+    Entailment answers reused through monotonicity over the region lattice.
+
+    A region is keyed by the range of threshold cells it covers on each
+    feature, which is all the ensemble can distinguish. If a region entails
+    a class so does every region inside it, and if it does not then no
+    region containing it does either, so a query is answered by any stored
+    positive box around it or negative box inside it. Negative boxes keep
+    their counterexample, whose threshold cells lie inside every region
+    they answer.
+    """
+    def __init__(self, index: LeafIndex, max_size=1024):
+        self.index = index
+        self.features = index.split_features
+        self.max_size = max_size
+        self.tables = {}
+        self.hits = 0
+        self.misses = 0
+        self._clock = 0
+
+    def region_box(self, r: Region):
+        """Inclusive (lows, highs) threshold cell indices of r on the split features."""
+        box = self.index.region_box(r)[self.features]
+        return box[:, 0], box[:, 1]
+
+    def lookup(self, r: Region, c):
+        """
+        Cached (entails, witness) for r and class c, or None on a miss.
+        """
+        lo, hi = self.region_box(r)
+        self._clock += 1
+        positive = self._table(c, True)
+        slot = positive.find_superset(lo, hi)
+        if slot is not None:
+            positive.touch(slot, self._clock)
+            self.hits += 1
+            return True, None
+        negative = self._table(c, False)
+        slot = negative.find_subset(lo, hi)
+        if slot is not None:
+            negative.touch(slot, self._clock)
+            self.hits += 1
+            return False, self._move_into(r, negative.witnesses[slot])
+        self.misses += 1
+        return None
+
+    def insert(self, r: Region, c, entails: bool, witness=None):
+        lo, hi = self.region_box(r)
+        self._clock += 1
+        key = (tuple(lo), tuple(hi))
+        subsumes = "subsets" if entails else "supersets"
+        self._table(c, entails).insert(key, lo, hi, self._clock, witness, subsumes)
+
+    def _move_into(self, r: Region, x):
+        """
+        Move a stored witness into the bounds of r without changing the
+        threshold cell of any feature, and so without changing its class.
+        """
+        x = list(x)
+        for f_id, (lower, upper) in r.bounds.items():
+            if x[f_id] is None or lower <= x[f_id] < upper:
+                continue
+            ts = self.index.thresholds[f_id]
+            cell = bisect.bisect_right(ts, x[f_id])
+            x[f_id] = max(ts[cell-1], lower) if cell > 0 else lower
+        return x
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def _table(self, c, entails):
+        if (c, entails) not in self.tables:
+            self.tables[(c, entails)] = BoxTable(len(self.features), self.max_size)
+        return self.tables[(c, entails)]
@@ -1,140 +1,264 @@
-from pysat.formula import WCNFPlus, IDPool
-from pysat.card import CardEnc
-from pysat.examples.rc2 import RC2
+import bisect
+from math import gcd
+
+from pysat.formula import IDPool
+from pysat.pb import PBEnc, EncType
+from pysat.solvers import Solver
 
 from src.model import Model
 from src.regions import Region
-from src.utils.sat_shortcuts import *
-
+from src.entailment.base_entailer import BaseEntailmentChecker
+from src.utils.fixed_point import fixed_point_scale, to_fixed_point
 
-class EntailmentChecker:
-    _no_parent = 2147483647
 
-    def __init__(self, model: Model):
-        self.model = model
-        self.grp_vars = {grp_id : [] for grp_id in set(self.model.tree_info)}
-        self.used_features = model.thresholds.keys()
+class EntailmentChecker(BaseEntailmentChecker):
+    """
+    Entailment over a pure SAT encoding of the ensemble.
 
+    Every feature gets order-encoded threshold atoms o_f_j <-> x_f >= t_j,
+    every tree gets one selection literal per leaf, and each class-margin
+    comparison is a pseudo-Boolean constraint over integer-scaled leaf
+    weights. Everything lives on one incremental SAT solver, and regions
+    and objectives are passed to it as assumptions.
+    """
+    def __init__(
+            self, 
+            model: Model, 
+            solver="g4", 
+            pb_enc=EncType.binmerge, 
+            precision=(8, 16),
+            prefilter=True,
+            cache_size=1024,
+            pool=True,
+            multiclass="loop"
+        ):
+        """
+        precision: bit widths that the per-tree leaf weight ranges are
+            rounded to, tried in order before the exact weights.
+            Counterexamples admitted by a rounded encoding are checked
+            against the exact weights, and only inconclusive queries move
+            on to the next width.
+        """
+        super().__init__(
+            model, 
+            prefilter=prefilter, 
+            cache_size=cache_size, 
+            pool=pool, 
+            multiclass=multiclass
+        )
+        self.pb_enc = pb_enc
+        self.precision = precision
         self.vpool = IDPool(start_from=1)
-        self.wcnf = WCNFPlus()
-        self.constraints = []
-        self.cexample = None
-        self.oracle_calls = 0
+        self.solver = Solver(name=solver)
+        self.thresholds = {
+            f_id: list(ts) for f_id, ts in self.model.thresholds.items()
+        }
+        self.leaves = {grp_id: [] for grp_id in self.groups}
+        self.objective_sels = {}
+        self.assumption_bounds = {}
 
         self._encode_domains()
         self._encode_model()
+        self.int_weights = self._fixed_point_weights()
 
     def __str__(self):
-        return str(self.feature_vars) + str(self.grp_vars) + str(self.constraints)
-    
-    def predict(self, x: list[float], ws=None):
-        if ws is None:
-            ws = self._get_weights(x)
-        elif not type(ws) == list:
-            ws = list(ws)
-
-        objective = self.model.objective
-        if objective == "binary:logistic":
-            return 0 if ws[0] < 0 else 1
-        elif objective == "multi:softprob" or objective == "multi:softmax":
-            return ws.index(max(ws))
-
-    def entails(self, r: Region, out):
-        objective = self.model.objective
-        if out not in self.grp_vars.keys() and "multi" in objective:
-            raise ValueError(f"{out} not in valid classes {self.grp_vars.keys()}")
-
-        if objective == "binary:logistic":
-            w = Sum(self.grp_vars[0])
-            objective_c = w > 0 if out == 0 else w < 0
-            if self._exists_counterexample(r, objective_c):
-                return False
-        elif objective == "multi:softprob" or objective == "multi:softmax":
-            for grp in self.grp_vars.keys():
-                if grp == out:
-                    continue
-                objective_c = Sum(self.grp_vars[out]) < Sum(self.grp_vars[grp])
-                if self._exists_counterexample(r, objective_c):
-                    return False
-        else:
-            raise NotImplementedError(f"objective {objective} not implemented")
-        return True
-    
-    def reset(self):
-        self.cexample = None
-        self.oracle_calls = 0
+        return f"SAT entailer: {self.vpool.top} vars"
 
     def _get_index_functions(self):
-        pass
+        o = lambda i, j: self.vpool.id(f"o_{i}_{j}")  # x_i >= t_ij
+        y = lambda t, n: self.vpool.id(f"y_{t}_{n}")  # leaf n of tree t selected
+        s = lambda key: self.vpool.id(f"s_{'_'.join(str(k) for k in key)}")
+        return o, y, s
 
     def _encode_domains(self):
-        
-    
-    def _get_weights(self, x: list[float]):
-        x_enc = And([
-            self.feature_vars[i] == x[i] 
-            for i in range(self.model.num_feature)
-        ])
-
-        solver = Solver()
-        solver.add(*self.constraints, x_enc)
-        if solver.check() == unsat:
-            raise ValueError("error: unsat prediction")
-        self.oracle_calls += 1
-
-        model = solver.model()
-        ws = [-1 for i in range(max(self.grp_vars.keys())+1)]
-        for grp in self.grp_vars.keys():
-            ws[grp] = sum([
-                float(model[w_var].as_decimal(30))
-                for w_var in self.grp_vars[grp]
-            ])
-        return ws 
+        o, y, s = self._get_index_functions()
+        for i, ts in self.thresholds.items():
+            for j in range(1, len(ts)):
+                self.solver.add_clause([-o(i,j), o(i,j-1)])  # x_i >= t_ij -> x_i >= t_i(j-1)
 
     def _encode_model(self):
+        o, y, s = self._get_index_functions()
         for tree in self.model.trees:
             grp_id = self.model.tree_info[tree.tree_id]
-            w_var = Real('w%d' % tree.tree_id)
-            self.grp_vars[grp_id].append(w_var)
-            for node_id in range(len(tree.nodes)):
+            for node_id in range(len(tree)):
                 if tree.is_leaf(node_id) and not tree.is_deleted(node_id):
-                    path_enc = self._encode_path(tree, node_id)
-                    leaf_w = tree.split_condition(node_id)
-                    self.constraints.append(Implies(path_enc, w_var == leaf_w))
+                    path = self._encode_path(tree, node_id)
+                    leaf = y(tree.tree_id, node_id)
+                    for lit in path:
+                        self.solver.add_clause([-leaf, lit])
+                    self.solver.add_clause([-lit for lit in path] + [leaf])
+                    self.leaves[grp_id].append(
+                        (tree.tree_id, leaf, tree.split_condition(node_id))
+                    )
 
     def _encode_path(self, tree, node_id):
+        o, y, s = self._get_index_functions()
         path = []
         while tree.parent(node_id) != self._no_parent:
             parent_id = tree.parent(node_id)
             split_ind = tree.split_index(parent_id)
             split_val = tree.split_condition(parent_id)
+            atom = o(split_ind, self.thresholds[split_ind].index(split_val))
             if tree.left_child(parent_id) == node_id:
-                path.append(self.feature_vars[split_ind] < split_val)
+                path.append(-atom)
             elif tree.right_child(parent_id) == node_id:
-                path.append(self.feature_vars[split_ind] >= split_val)
-            node_id = parent_id 
-        return And(*path)
-
-    def _exists_counterexample(self, r: Region, objective):
-        r_enc = And([
-            And(
-                self.feature_vars[f_id] >= r.bounds[f_id][0],
-                self.feature_vars[f_id] < r.bounds[f_id][1]
-            )
-            for f_id in r.bounds.keys() 
-        ])
-
-        solver = Solver()
-        solver.add(*self.constraints, objective, r_enc)
-        self.oracle_calls += 1
-        if solver.check() == unsat:
-            self.cexample = None
-            return False
+                path.append(atom)
+            node_id = parent_id
+        return path
+
+    def _fixed_point_weights(self):
+        """Exact integer leaf weights, scaled by a common power of ten."""
+        weights = {
+            leaf: w for leaves in self.leaves.values() for (_, leaf, w) in leaves
+        }
+        k = fixed_point_scale(weights.values(), max_digits=float("inf"))
+        if k is None:
+            raise ValueError("error: leaf weights are not finite")
+        return {leaf: to_fixed_point(w, k) for leaf, w in weights.items()}
+
+    def _objective_terms(self, key):
+        """Signed exact weights of each tree's leaves in the objective of key.
+
+        A counterexample to key selects leaves whose signed weights sum to a
+        negative number.
+        """
+        if len(key) == 1:
+            terms = [(-1 if key[0] == 0 else 1, self.leaves[0])]
         else:
-            self.cexample = []
-            for f_id in self.feature_vars.keys():
-                result = solver.model()[self.feature_vars[f_id]]
-                if result is not None:
-                    result = float(result.as_decimal(30))
-                self.cexample.append(result)
-            return True
+            out, grp = key
+            terms = [(1, self.leaves[out]), (-1, self.leaves[grp])]
+        per_tree = {}
+        for coef, leaves in terms:
+            for (tree_id, leaf, _) in leaves:
+                per_tree.setdefault(tree_id, []).append((leaf, coef*self.int_weights[leaf]))
+        return per_tree
+
+    def _objective_sel(self, key, bits=None):
+        """
+        Selector literal enforcing the counterexample condition of key, with
+        leaf weights rounded down so that the widest tree spans about 2^bits
+        units, or exact weights if bits is None.
+
+        Rounding down can only lower the sum, so every real counterexample
+        also satisfies the rounded constraint. Rounded counterexamples need
+        to be confirmed against the exact weights.
+        """
+        if (key, bits) in self.objective_sels:
+            return self.objective_sels[(key, bits)]
+        o, y, s = self._get_index_functions()
+        sel = s(key + (bits,))
+        self.objective_sels[(key, bits)] = sel
+
+        if len(key) > 2:
+            out = key[0]
+            self.solver.add_clause(
+                [-sel] + [self._objective_sel((out, grp), bits) for grp in key[1:]]
+            )
+            return sel
+
+        terms = self._objective_terms(key)
+        div = 1
+        if bits is not None:
+            span = max(
+                max(w for (_, w) in leaf_ws) - min(w for (_, w) in leaf_ws)
+                for leaf_ws in terms.values()
+            )
+            div = max(1, span >> bits)
+
+        # Exactly one leaf per tree is selected, so shifting every weight of
+        # a tree by its minimum keeps coefficients non-negative.
+        bound = -1
+        lits, weights = [], []
+        for leaf_ws in terms.values():
+            leaf_ws = [(leaf, w // div) for (leaf, w) in leaf_ws]
+            w_min = min(w for (_, w) in leaf_ws)
+            bound -= w_min
+            for (leaf, w) in leaf_ws:
+                if w > w_min:
+                    lits.append(leaf)
+                    weights.append(w - w_min)
+
+        if bound < 0:
+            self.solver.add_clause([-sel])
+            return sel
+        if sum(weights) <= bound:
+            return sel
+        div = 0
+        for w in weights:
+            div = gcd(div, w)
+        weights = [w // div for w in weights]
+        bound = bound // div
+
+        # Only the adder encoding stays compact for full-width exact weights.
+        cnf = PBEnc.leq(
+            lits=lits, weights=weights, bound=bound, vpool=self.vpool,
+            encoding=self.pb_enc if bits is not None else EncType.adder
+        )
+        for clause in cnf.clauses:
+            self.solver.add_clause(clause + [-sel])
+        return sel
+
+    def _is_counterexample(self, key, model):
+        """Check the leaves selected by a solver model against exact weights."""
+        if len(key) > 2:
+            return any(self._is_counterexample((key[0], grp), model) for grp in key[1:])
+        total = 0
+        for leaf_ws in self._objective_terms(key).values():
+            for (leaf, w) in leaf_ws:
+                if model[leaf-1] > 0:
+                    total += w
+        return total < 0
+
+    def _region_assumptions(self, r: Region):
+        o, y, s = self._get_index_functions()
+        assumptions = []
+        self.assumption_bounds = {}
+        for f_id, (lower, upper) in r.bounds.items():
+            if f_id not in self.thresholds:
+                continue
+            ts = self.thresholds[f_id]
+            j = bisect.bisect_right(ts, lower) - 1  # largest t_j <= lower
+            if j >= 0:
+                assumptions.append(o(f_id, j))
+                self.assumption_bounds[o(f_id, j)] = (f_id, 0)
+            k = bisect.bisect_left(ts, upper)  # smallest t_k >= upper
+            if k < len(ts):
+                assumptions.append(-o(f_id, k))
+                self.assumption_bounds[-o(f_id, k)] = (f_id, 1)
+        return assumptions
+
+    def _exists_counterexample(self, r: Region, key):
+        assumptions = self._region_assumptions(r)
+        for bits in tuple(self.precision) + (None,):
+            sel = self._objective_sel(key, bits)
+            # every width is a separate SAT call
+            self.oracle_calls += 1
+            if not self.solver.solve(assumptions=assumptions + [sel]):
+                self.cexample = None
+                self.last_core = {
+                    self.assumption_bounds[lit] for lit in self.solver.get_core() or []
+                    if lit in self.assumption_bounds
+                }
+                return False
+            model = self.solver.get_model()
+            if self._is_counterexample(key, model):
+                self.cexample = self._model_to_instance(r, model)
+                return True
+        raise ValueError("error: exact counterexample rejected by exact weights")
+
+    def _model_to_instance(self, r: Region, model):
+        """Pick a point of the satisfying cell which lies inside r."""
+        o, y, s = self._get_index_functions()
+        x = []
+        for f_id in range(self.model.num_feature):
+            lower = r.bounds[f_id][0] if f_id in r.bounds.keys() else None
+            if f_id not in self.thresholds:
+                x.append(lower)
+                continue
+            ts = self.thresholds[f_id]
+            j = 0
+            while j < len(ts) and model[o(f_id,j)-1] > 0:
+                j += 1
+            cell_lower = ts[j-1] if j > 0 else ts[0] - 1
+            x.append(cell_lower if lower is None else max(cell_lower, lower))
+        return x
@@ -1,131 +1,278 @@
+import logging
+from decimal import Decimal
+
 from z3 import *
 
 from ..model import Model
 from ..regions import Region
+from .base_entailer import BaseEntailmentChecker
+from ..utils.fixed_point import fixed_point_scale, to_fixed_point
 
 
-class EntailmentChecker:
-    _no_parent = 2147483647
-
-    def __init__(self, model: Model):
-        self.model = model
-        self.grp_vars = {grp_id : [] for grp_id in set(self.model.tree_info)}
-        self.used_features = model.thresholds.keys()
+class EntailmentChecker(BaseEntailmentChecker):
+    def __init__(
+            self, 
+            model: Model, 
+            incremental=True, 
+            prefilter=True, 
+            cache_size=1024,
+            pool=True,
+            multiclass="loop",
+            arithmetic="real",
+            encoding="full",
+            smt2=None
+        ):
+        """
+        incremental: keep one long-lived solver holding the ensemble
+            encoding, and pass each region and objective as assumption
+            literals instead of rebuilding a solver for every query.
+        arithmetic: "real" encodes leaf weights as rationals, "int" scales
+            them by a common power of ten to exact integers. Falls back to
+            "real" when the weights need too many digits to scale.
+        encoding: "full" encodes the whole ensemble once. "region" builds a
+            fresh solver for every query, holding only the leaves whose box
+            meets the query region, with trees that have a single reachable
+            weight folded into constants.
+        smt2: SMT-LIB2 text from encoding_smt2() of an entailer built with
+            the same model and options, loaded instead of encoding the
+            trees again.
+        """
+        super().__init__(
+            model, 
+            prefilter=prefilter, 
+            cache_size=cache_size, 
+            pool=pool, 
+            multiclass=multiclass
+        )
+        if encoding not in ("full", "region"):
+            raise ValueError(f"{encoding} not a valid encoding")
+        self.encoding = encoding
+        self.incremental = incremental and encoding == "full"
+        if arithmetic not in ("real", "int"):
+            raise ValueError(f"{arithmetic} not a valid arithmetic")
+        self.scale = None
+        if arithmetic == "int":
+            self.scale = fixed_point_scale(
+                tree.split_condition(node_id)
+                for tree in self.model.trees
+                for node_id in range(len(tree))
+                if tree.is_leaf(node_id) and not tree.is_deleted(node_id)
+            )
+            if self.scale is None:
+                logging.info("Leaf weights cannot be scaled to integers, using real arithmetic")
+        self.grp_vars = {grp_id : [] for grp_id in self.groups}
+        self.grp_margins = {}
         self.feature_vars = {
             i: Real('x%d' % i) 
             for i in range(self.model.num_feature)
         }
         self.constraints = []
-        self.cexample = None
-        self.oracle_calls = 0
+        self.split_atoms = {}
 
-        self._encode_model()
+        self.solver = None
+        self.bound_guards = {}
+        self.guard_bounds = {}
+        self.objective_guards = {}
+
+        if self.encoding == "full" and smt2 is not None:
+            self._load_encoding(smt2)
+        elif self.encoding == "full":
+            self._encode_model()
+        if self.incremental:
+            self._init_solver()
 
     def __str__(self):
         return str(self.feature_vars) + str(self.grp_vars) + str(self.constraints)
-    
-    def predict(self, x: list[float], ws=None):
-        if ws is None:
-            ws = self._get_weights(x)
-        elif not type(ws) == list:
-            ws = list(ws)
-
-        objective = self.model.objective
-        if objective == "binary:logistic":
-            return 0 if ws[0] < 0 else 1
-        elif objective == "multi:softprob" or objective == "multi:softmax":
-            return ws.index(max(ws))
-
-    def entails(self, r: Region, out):
-        objective = self.model.objective
-        if out not in self.grp_vars.keys() and "multi" in objective:
-            raise ValueError(f"{out} not in valid classes {self.grp_vars.keys()}")
-
-        if objective == "binary:logistic":
-            w = Sum(self.grp_vars[0])
-            objective_c = w > 0 if out == 0 else w < 0
-            if self._exists_counterexample(r, objective_c):
-                return False
-        elif objective == "multi:softprob" or objective == "multi:softmax":
-            for grp in self.grp_vars.keys():
-                if grp == out:
-                    continue
-                objective_c = Sum(self.grp_vars[out]) < Sum(self.grp_vars[grp])
-                if self._exists_counterexample(r, objective_c):
-                    return False
-        else:
-            raise NotImplementedError(f"objective {objective} not implemented")
-        return True
-    
-    def reset(self):
-        self.cexample = None
-        self.oracle_calls = 0
-    
-    def _get_weights(self, x: list[float]):
-        x_enc = And([
-            self.feature_vars[i] == x[i] 
-            for i in range(self.model.num_feature)
-        ])
-
-        solver = Solver()
-        solver.add(*self.constraints, x_enc)
-        if solver.check() == unsat:
-            raise ValueError("error: unsat prediction")
-        self.oracle_calls += 1
-
-        model = solver.model()
-        ws = [-1 for i in range(max(self.grp_vars.keys())+1)]
-        for grp in self.grp_vars.keys():
-            ws[grp] = sum([
-                float(model[w_var].as_decimal(30))
-                for w_var in self.grp_vars[grp]
-            ])
-        return ws 
 
     def _encode_model(self):
+        self._init_vars()
         for tree in self.model.trees:
-            grp_id = self.model.tree_info[tree.tree_id]
-            w_var = Real('w%d' % tree.tree_id)
-            self.grp_vars[grp_id].append(w_var)
-            for node_id in range(len(tree.nodes)):
+            w_var = self._tree_var(tree.tree_id)
+            for node_id in range(len(tree)):
                 if tree.is_leaf(node_id) and not tree.is_deleted(node_id):
                     path_enc = self._encode_path(tree, node_id)
-                    leaf_w = tree.split_condition(node_id)
+                    leaf_w = self._leaf_weight(tree.split_condition(node_id))
                     self.constraints.append(Implies(path_enc, w_var == leaf_w))
+        for grp_id, m_var in self.grp_margins.items():
+            self.constraints.append(m_var == Sum(self.grp_vars[grp_id]))
+
+    def _init_vars(self):
+        for tree in self.model.trees:
+            grp_id = self.model.tree_info[tree.tree_id]
+            self.grp_vars[grp_id].append(self._tree_var(tree.tree_id))
+        if self.multiclass == "disjunctive":
+            # one named margin per group, shared by every competing class
+            for grp_id in self.groups:
+                m_var = Real('m%d' % grp_id) if self.scale is None else Int('m%d' % grp_id)
+                self.grp_margins[grp_id] = m_var
+
+    def _load_encoding(self, smt2: str):
+        """Ensemble constraints parsed from encoding_smt2() output."""
+        self._init_vars()
+        self.constraints = list(parse_smt2_string(smt2))
+
+    def encoding_smt2(self) -> str:
+        """SMT-LIB2 text of the ensemble encoding, for the smt2 option."""
+        solver = Solver()
+        solver.add(*self.constraints)
+        return solver.sexpr()
 
-    def _encode_path(self, tree, node_id):
+    def _encode_path(self, tree, node_id, r: Region = None):
+        """Path condition of a leaf, leaving out conditions implied by r."""
+        bounds = r.bounds if r is not None else {}
         path = []
         while tree.parent(node_id) != self._no_parent:
             parent_id = tree.parent(node_id)
             split_ind = tree.split_index(parent_id)
             split_val = tree.split_condition(parent_id)
+            b = bounds.get(split_ind)
             if tree.left_child(parent_id) == node_id:
-                path.append(self.feature_vars[split_ind] < split_val)
+                if b is None or b[1] > split_val:
+                    path.append(self._split_atom(split_ind, split_val, 1))
             elif tree.right_child(parent_id) == node_id:
-                path.append(self.feature_vars[split_ind] >= split_val)
+                if b is None or b[0] < split_val:
+                    path.append(self._split_atom(split_ind, split_val, 0))
             node_id = parent_id 
         return And(*path)
 
-    def _exists_counterexample(self, r: Region, objective):
-        r_enc = And([
-            And(
-                self.feature_vars[f_id] >= r.bounds[f_id][0],
-                self.feature_vars[f_id] < r.bounds[f_id][1]
-            )
-            for f_id in r.bounds.keys() 
-        ])
+    def _split_atom(self, f_id, val, side):
+        """x_f >= val (side 0) or x_f < val (side 1), built once."""
+        key = (f_id, val, side)
+        if key not in self.split_atoms:
+            x = self.feature_vars[f_id]
+            self.split_atoms[key] = x >= val if side == 0 else x < val
+        return self.split_atoms[key]
 
-        solver = Solver()
-        solver.add(*self.constraints, objective, r_enc)
+    def _leaf_weight(self, w):
+        return w if self.scale is None else to_fixed_point(w, self.scale)
+
+    def _encode_region(self, r: Region):
+        """
+        Constraints and per-group margin terms of the ensemble restricted
+        to r. Leaves whose box misses r are left out, and a tree whose
+        reachable leaves share one weight is just that constant.
+        """
+        index = self.model.leaf_index
+        reach = index.reachable(index.region_box(r))[0]
+        constraints = []
+        terms = {grp_id: [] for grp_id in self.groups}
+        offsets = {grp_id: 0 for grp_id in self.groups}
+        for tree in self.model.trees:
+            grp_id = self.model.tree_info[tree.tree_id]
+            start = index.leaf_starts[tree.tree_id]
+            nodes = index.leaf_nodes[tree.tree_id]
+            reachable = reach[start:start+len(nodes)]
+            nodes = nodes[reachable]
+            weights = index.weights[tree.tree_id][reachable]
+            if len(set(weights)) == 1:
+                offsets[grp_id] += Decimal(repr(float(weights[0])))
+                continue
+            w_var = self._tree_var(tree.tree_id)
+            terms[grp_id].append(w_var)
+            for node_id, w in zip(nodes, weights):
+                path_enc = self._encode_path(tree, int(node_id), r)
+                constraints.append(Implies(path_enc, w_var == self._leaf_weight(float(w))))
+        margins = {}
+        for grp_id in self.groups:
+            offset = offsets[grp_id]
+            if self.scale is None:
+                offset = RealVal(str(offset))
+            else:
+                offset = IntVal(int(offset.scaleb(self.scale)))
+            margins[grp_id] = Sum(terms[grp_id] + [offset])
+        return constraints, margins
+
+    def _tree_var(self, tree_id):
+        return Real('w%d' % tree_id) if self.scale is None else Int('w%d' % tree_id)
+
+    def _init_solver(self):
+        self.solver = Solver()
+        self.solver.add(*self.constraints)
+
+    def _objective(self, key, margins=None):
+        """Constraint satisfied only by counterexamples to the objective key.
+
+        key is (out,) for binary objectives and (out, grp, ...) for
+        multiclass objectives, where the grps are the competing classes.
+        margins optionally maps groups to margin terms to compare instead
+        of those of the full encoding.
+        """
+        margin = margins.get if margins is not None else self._margin
+        if len(key) == 1:
+            w = margin(0)
+            return w > 0 if key[0] == 0 else w < 0
+        out = key[0]
+        return Or([margin(out) < margin(grp) for grp in key[1:]])
+
+    def _margin(self, grp_id):
+        if grp_id in self.grp_margins:
+            return self.grp_margins[grp_id]
+        return Sum(self.grp_vars[grp_id])
+
+    def _objective_guard(self, key):
+        if key not in self.objective_guards:
+            guard = Bool("o_%s" % "_".join(str(k) for k in key))
+            self.solver.add(Implies(guard, self._objective(key)))
+            self.objective_guards[key] = guard
+        return self.objective_guards[key]
+
+    def _bound_guard(self, f_id, side, val):
+        """Guard literal for x_f >= val (side 0) or x_f < val (side 1)."""
+        key = (f_id, side, val)
+        if key not in self.bound_guards:
+            guard = Bool("b%d" % len(self.bound_guards))
+            x = self.feature_vars[f_id]
+            self.solver.add(Implies(guard, x >= val if side == 0 else x < val))
+            self.bound_guards[key] = guard
+            self.guard_bounds[str(guard)] = (f_id, side)
+        return self.bound_guards[key]
+
+    def _region_assumptions(self, r: Region):
+        return [
+            self._bound_guard(f_id, side, r.bounds[f_id][side])
+            for f_id in r.bounds.keys()
+            for side in (0, 1)
+        ]
+
+    def _exists_counterexample(self, r: Region, key):
         self.oracle_calls += 1
-        if solver.check() == unsat:
+        if self.incremental:
+            solver = self.solver
+            assumptions = self._region_assumptions(r)
+            assumptions.append(self._objective_guard(key))
+            result = solver.check(*assumptions)
+        elif self.encoding == "region":
+            constraints, margins = self._encode_region(r)
+            solver = Solver()
+            solver.add(*constraints, self._objective(key, margins))
+            for f_id, (lower, upper) in r.bounds.items():
+                solver.add(self.feature_vars[f_id] >= lower, self.feature_vars[f_id] < upper)
+            result = solver.check()
+        else:
+            r_enc = And([
+                And(
+                    self.feature_vars[f_id] >= r.bounds[f_id][0],
+                    self.feature_vars[f_id] < r.bounds[f_id][1]
+                )
+                for f_id in r.bounds.keys() 
+            ])
+            solver = Solver()
+            solver.add(*self.constraints, self._objective(key), r_enc)
+            result = solver.check()
+
+        if result == unsat:
             self.cexample = None
+            self.last_core = None
+            if self.incremental:
+                self.last_core = {
+                    self.guard_bounds[str(lit)] for lit in solver.unsat_core()
+                    if str(lit) in self.guard_bounds
+                }
             return False
         else:
+            model = solver.model()
             self.cexample = []
             for f_id in self.feature_vars.keys():
-                result = solver.model()[self.feature_vars[f_id]]
-                if result is not None:
-                    result = float(result.as_decimal(30))
-                self.cexample.append(result)
-            return True
\ No newline at end of file
+                result = model.eval(self.feature_vars[f_id], model_completion=True)
+                self.cexample.append(float(result.as_decimal(30)))
+            return True
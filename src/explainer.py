@@ -10,6 +10,7 @@ import numpy as np
 from xgboost import XGBClassifier
 
 from .entailment.z3_entailer import EntailmentChecker as Z3EntailmentChecker
+from .entailment.maxsat_entailer import EntailmentChecker as SatEntailmentChecker
 from .regions import Region, FeatureSpaceInfo
 from .model import Model
 from .generators.z3_generator import SeedGenerator as Z3Generator
@@ -23,25 +24,66 @@ from .traverser import LatticeTraverser
 class ExplanationProgram:
     _trivially_optimal = ["maxsat", "maxstrat", "incrmaxsat", "ucs"]
     _uses_oracle = ["maxsat"]
+    _specialisable = ["maxsat", "maxstrat", "incrmaxsat", "ucs"]
 
-    def __init__(self, model: Model, limits=None, seed_gen="rand", mpath=None):
-        self.fs_info = FeatureSpaceInfo(model.thresholds, limits=limits)
-        self.entailer = Z3EntailmentChecker(model)
+    def __init__(
+            self, 
+            model: Model, 
+            limits=None, 
+            seed_gen="rand", 
+            mpath=None, 
+            entailment="z3",
+            multiclass="loop",
+            compiled=None,
+            bound_encoding="direct",
+            specialise=False,
+            entailer_options=None,
+            max_frontier=None
+        ):
+        """
+        compiled: CompiledModel of model (see compile_model) whose feature
+            space, ensemble encoding and seed generator formula are reused
+            instead of being built again.
+        bound_encoding: bound encoding of the SAT seed generators,
+            "direct" or the linear "order" encoding.
+        specialise: build the seed generator in enumerate_explanations
+            for the instance's cell, so it only encodes intervals that
+            contain it. The compiled generator formula is then unused.
+        entailer_options: further keyword arguments of the entailer, e.g.
+            {"encoding": "region"} or {"arithmetic": "int"} for Z3. The
+            compiled ensemble encoding is only used without them.
+        max_frontier: most entries kept on the frontier of the ucs seed
+            generator. Once it has to drop some, seeds may be missed and
+            search_complete is False after enumerate_explanations.
+        """
+        entailer_options = entailer_options or {}
+        if compiled is not None:
+            self.fs_info = compiled.fs_info
+        else:
+            self.fs_info = FeatureSpaceInfo(model.thresholds, limits=limits)
+        if entailment == "z3":
+            smt2 = None
+            if compiled is not None and multiclass != "disjunctive" and not entailer_options:
+                smt2 = compiled.smt2
+            self.entailer = Z3EntailmentChecker(
+                model, multiclass=multiclass, smt2=smt2, **entailer_options
+            )
+        elif entailment == "sat":
+            self.entailer = SatEntailmentChecker(model, multiclass=multiclass, **entailer_options)
+        else:
+            raise ValueError(f"{entailment} not a valid entailment method")
         self.seed_gen = seed_gen
         self.mpath = mpath
-        if seed_gen == "rand" or seed_gen == "min":
-            self.generator = Z3Generator(self.fs_info, method=seed_gen)
-        elif seed_gen == "maxsat":
-            self.generator = Rc2Generator(self.fs_info)
-        elif seed_gen == "maxstrat":
-            self.generator = StratifiedRc2Generator(self.fs_info)
-        elif seed_gen == "ucs":
-            self.generator = UcsGenerator(self.fs_info)
-        elif seed_gen == "incrmaxsat":
-            self.generator = IncrementalGenerator(self.fs_info)
-        else:
-            raise ValueError(f"{seed_gen} not a valid seed generation method")
-        self.traverser = LatticeTraverser(self.entailer, self.fs_info.domains)
+        self.compiled = compiled
+        self.bound_encoding = bound_encoding
+        self.specialise = specialise
+        if specialise and seed_gen not in self._specialisable:
+            raise ValueError(f"{seed_gen} seed generation can't be specialised to an instance")
+        if max_frontier is not None and seed_gen != "ucs":
+            raise ValueError(f"{seed_gen} seed generation has no frontier to bound")
+        self.max_frontier = max_frontier
+        self.generator = None if specialise else self._new_generator()
+        self.traverser = LatticeTraverser(self.entailer, self.fs_info)
 
         self.total_blocked = 0
         self.n_entailing = 0
@@ -50,12 +92,36 @@ class ExplanationProgram:
         self.max_region = None
         self.seed_score = -1
         self.seed_entailing = False
+        # False when the generator dropped seeds, so the search ending does
+        # not mean every seed was seen
+        self.search_complete = True
 
         self._explain_t = -1
         self._sat_calls = -1
         self._seed_gen_t = -1
         self._traversal_t = -1
 
+    def _new_generator(self, instance=None):
+        """Seed generator over the feature space, restricted to instance if given."""
+        seed_gen = self.seed_gen
+        if seed_gen == "rand" or seed_gen == "min":
+            return Z3Generator(self.fs_info, method=seed_gen)
+        elif seed_gen == "maxsat" or seed_gen == "maxstrat":
+            cnf_state = None
+            if self.compiled is not None and instance is None:
+                cnf_state = self.compiled.cnf_state(seed_gen)
+            if cnf_state is not None and cnf_state["encoding"] != self.bound_encoding:
+                cnf_state = None
+            generator = Rc2Generator if seed_gen == "maxsat" else StratifiedRc2Generator
+            return generator(
+                self.fs_info, cnf_state=cnf_state, encoding=self.bound_encoding, instance=instance
+            )
+        elif seed_gen == "ucs":
+            return UcsGenerator(self.fs_info, max_frontier=self.max_frontier, instance=instance)
+        elif seed_gen == "incrmaxsat":
+            return IncrementalGenerator(self.fs_info, encoding=self.bound_encoding, instance=instance)
+        raise ValueError(f"{seed_gen} not a valid seed generation method")
+
     def __repr__(self):
         s = ""
         s += "n_features: %d\n" % self.model.num_feature
@@ -102,8 +168,9 @@ class ExplanationProgram:
     def explain(self, x: list[float]):
         """Find a maximal explanation which contain the instance x."""
         start_t = time.perf_counter()
-        self.init_region = self._instance_to_region(x)
+        self.init_region = self._instance_to_leaf_region(x)
         c = self.entailer.predict(x)
+        self.entailer.set_instance(x)
         self.traverser.must_contain(self.init_region)
         self.traverser.grow(self.init_region, c) 
         end_t = time.perf_counter()
@@ -114,6 +181,9 @@ class ExplanationProgram:
     def enumerate_explanations(self, x: list[float], block_score=False):
         self.init_region = self._instance_to_region(x)
         c = self.entailer.predict(x)
+        self.entailer.set_instance(x)
+        if self.specialise:
+            self.generator = self._new_generator(self.init_region)
         self.generator.must_contain(self.init_region)
         self.traverser.must_contain(self.init_region)
         # self._preseed_generator(c)
@@ -130,8 +200,7 @@ class ExplanationProgram:
                 # logging.info(f"Non entailing seed generated")
                 # logging.info(f"\n{r}")
                 t1 = time.perf_counter_ns()
-                r = self._instance_to_region(self.entailer.cexample)
-                self.traverser.eliminate_vars(r)
+                r = self._generalise_counterexample(self.entailer.cexample, c)
                 # logging.info(f"Eliminated features\n{r}")
                 # logging.info(f"\n{r}")
                 t2 = time.perf_counter_ns()
@@ -144,7 +213,7 @@ class ExplanationProgram:
                 self.seed_entailing = True
                 if not self.seed_gen in self._trivially_optimal:
                     t1 = time.perf_counter_ns()
-                    self.traverser.grow(r, c)
+                    self.traverser.grow(r, c, self.entailer.core)
                     t2 = time.perf_counter_ns()
                     self._traversal_t = (t2 - t1)/10**9
                 self._drop_features(r)
@@ -162,6 +231,7 @@ class ExplanationProgram:
                     # logging.info(f"\n{r}")
                     if self.n_entailing == 1:
                         self._log_stats()
+                        self._check_complete()
                         logging.info(f"MAX SCORE: {self.max_score}\n{self.max_region}")
                         self._sat_calls = self.entailer.oracle_calls
                         return None
@@ -174,6 +244,7 @@ class ExplanationProgram:
             t2 = time.perf_counter_ns()
             self._seed_gen_t = (t2 - t1)/10**9
         self._log_stats()
+        self._check_complete()
         logging.info(f"MAX SCORE: {self.max_score}\n{self.max_region}")
 
     def get_score(self, r: Region):
@@ -191,12 +262,26 @@ class ExplanationProgram:
     
     def reset(self):
         self.generator.reset()
+
+    def _check_complete(self):
+        self.search_complete = not getattr(self.generator, "truncated", False)
+        if not self.search_complete:
+            logging.warning("seeds were dropped, the search was incomplete")
     
     def _log_stats(self):
         s = "Generated "
         s += f"{self.n_entailing + self.n_nonentailing } "
         s += f"({self.n_entailing}E|{self.n_nonentailing}NE) seeds | "
         s += f"{self.entailer.oracle_calls} entailment checks | "
+        if self.entailer.prefilter_calls:
+            s += f"{self.entailer.prefilter_hits}/{self.entailer.prefilter_calls} "
+            s += "decided by margin bounds | "
+        if self.entailer.cache is not None:
+            cache = self.entailer.cache
+            s += f"{cache.hits}/{cache.hits + cache.misses} cache hits | "
+        if self.entailer.pool is not None:
+            pool = self.entailer.pool
+            s += f"{pool.hits} rejected by {len(pool)} stored counterexamples | "
         # s += f"max score: {self.max_score:.5f} | "
         s += f"current seed score: {self.seed_score:.5f}"
         logging.info(s)
@@ -207,8 +292,8 @@ class ExplanationProgram:
             if f_id not in self.fs_info.keys():
                 continue
             d = self.fs_info.get_domain(f_id)
-            if x[f_id] in d:
-                i = d.index(x[f_id])
+            if x[f_id] in self.fs_info.domain_index[f_id]:
+                i = self.fs_info.domain_index[f_id][x[f_id]]
                 if i == len(d):
                     bounds[f_id] = (d[i-1], d[i])
                 else:
@@ -223,18 +308,77 @@ class ExplanationProgram:
                     bounds[f_id] = (d[i-1], d[i])
         return Region(bounds)
     
+    def _instance_to_leaf_region(self, x: list[float]) -> Region:
+        """
+        Region of the instances that reach the same leaf as x in every tree.
+        They all share the prediction of x, so the region entails it
+        without a solver call.
+        """
+        lower, upper = self.entailer.predictor.leaf_box(x)
+        bounds = {}
+        for f_id in self.fs_info.keys():
+            d = self.fs_info.get_domain(f_id)
+            bounds[f_id] = (
+                d[0] if np.isneginf(lower[f_id]) else lower[f_id],
+                d[-1] if np.isposinf(upper[f_id]) else upper[f_id]
+            )
+        return Region(bounds)
+
+    def _generalise_counterexample(self, x: list[float], c) -> Region:
+        """
+        Non-entailing region around the counterexample x, found without
+        calling the solver.
+
+        Every instance in the intersection of the leaf boxes x reaches gets
+        the same prediction as x, so features that box leaves unbounded are
+        dropped from the elementary region of x straight away. Each other
+        feature is dropped if the margin bounds still show that the region
+        predicts against c everywhere once it spans the whole domain. The
+        kept features stay at the elementary region of x, which is the
+        smallest region and so blocks the most seeds in block_up.
+        """
+        r = self._instance_to_region(x)
+        lower, upper = self.entailer.predictor.leaf_box(x)
+        if not self.entailer.bounds_refute(r, c):
+            # x lies too close to the decision boundary for the bounds
+            self.traverser.eliminate_vars(r)
+            return r
+
+        # Free features first: the rest of r still lies in the leaf box.
+        to_remove = set(
+            f_id for f_id in self.fs_info.keys()
+            if np.isneginf(lower[f_id]) and np.isposinf(upper[f_id])
+        )
+        for f_id in to_remove:
+            d = self.fs_info.get_domain(f_id)
+            r.bounds[f_id] = (d[0], d[-1])
+        for f_id in self.fs_info.keys():
+            if f_id in to_remove:
+                continue
+            b = r.bounds[f_id]
+            d = self.fs_info.get_domain(f_id)
+            r.bounds[f_id] = (d[0], d[-1])
+            if self.entailer.bounds_refute(r, c):
+                to_remove.add(f_id)
+            else:
+                r.bounds[f_id] = b
+        for f_id in to_remove:
+            del r.bounds[f_id]
+        return r
+
     def _check_entailing_adjacents(self, r: Region, c: str):
         """Checks the entailing regions adjacent to the MinNER r for volume"""
         for f_id in self.fs_info.keys():
             for side in (0, 1):
                 d = self.fs_info.get_domain(f_id)
+                index = self.fs_info.domain_index[f_id]
                 b = r.bounds[f_id]
                 sb = self.traverser.search_bounds[f_id]
-                i = d.index(b[0]) if side == 0 else d.index(b[1])
+                i = index[b[0]] if side == 0 else index[b[1]]
 
-                if side == 0 and i+1 < d.index(b[1]) and i+1 <= sb[0]:
+                if side == 0 and i+1 < index[b[1]] and i+1 <= sb[0]:
                     r.bounds[f_id] = (d[i+1], b[1])
-                elif side == 1 and i-1 > d.index(b[0]) and i-1 >= sb[1]:
+                elif side == 1 and i-1 > index[b[0]] and i-1 >= sb[1]:
                     r.bounds[f_id] = (b[0], d[i-1])
                 else:
                     continue
@@ -9,6 +9,7 @@ from pysat.examples.hitman import Atom
 
 from src.regions import Region
 from src.utils.sat_shortcuts import *
+from src.utils.order_encoding import OrderEncoding
 from src.utils.modified_hitman import ModHitman
 
 
@@ -16,15 +17,25 @@ class SeedGenerator:
     """
     Generate unblocked seed with maximum volume.
     """
-    def __init__(self, fs_info, solver="g4"):
+    def __init__(self, fs_info, solver="g4", encoding="direct", instance=None):
+        """
+        encoding: "direct" or "order" bound encoding, see the maxsat
+            generator.
+        instance: Region every seed must contain, see the maxsat generator.
+        """
+        if encoding not in ("direct", "order"):
+            raise ValueError(f"{encoding} not a valid bound encoding")
         self.fs_info = fs_info
         self.vpool = IDPool(start_from=1)
+        self.encoding = encoding
+        self.order = OrderEncoding(self.vpool)
         self.hard = []
         self.to_hit = None
         self.weights = {}
         self.solver = solver
         self.interval_sizes = {}
         self.constraints = []
+        self.instance = {} if instance is None else self._region_to_didx(instance)
 
         self._init_hard_bounds()
         self._init_hard_intervals()
@@ -56,6 +67,23 @@ class SeedGenerator:
             for j in range(len(d)):
                 l(i,j)  # l_ij <-> d[j] is lower bound
                 u(i,j)  # u_ij <-> d[j] is upper bound
+            if self.encoding == "order":
+                bounds = self.order.bounds(i, len(d), l, u)
+                if i in self.instance:
+                    bounds += self.order.must_contain({i: self.instance[i]}, self.fs_info.domains)
+                self.constraints += bounds
+                self.hard += bounds
+                continue
+            if i in self.instance:
+                # Bounds either side of the instance are always ordered, so
+                # excluding the others replaces the l < u clauses
+                lower, upper = self._bound_ranges(i)
+                for j in range(len(d)):
+                    if j not in lower:
+                        self.hard.append([-l(i,j)])
+                    if j not in upper:
+                        self.hard.append([-u(i,j)])
+                continue
             self.hard.append([-l(i,len(d)-1)])  # Lower bound can't be highest threshold
             self.constraints.append(f"~{l(i,len(d)-1)}")
             self.hard.append([-u(i,0)])  # Upper bound can't be lowest threshold
@@ -80,16 +108,22 @@ class SeedGenerator:
         for i in self.fs_info.keys():
             d = self.fs_info.get_domain(i)
             sizes = []
-            for (j, k) in combinations(range(len(d)), 2):
+            for (j, k) in self._intervals(i):
                 I(i,j,k)  # I_ijk <-> interval is (d[j], d[k])
+                sizes.append(d[k]-d[j])
+                if self.encoding == "order":
+                    self.hard += self.order.interval(l(i,j), u(i,k), I(i,j,k))
+                    continue
                 constraint = Iff(And([l(i,j),u(i,k)]), I(i,j,k))
                 self.constraints.append(constraint)
                 self.hard += constraint.to_cnf()  # (l_ij ^ u_ik) <-> I_ijk
-                sizes.append(d[k]-d[j])
             self.interval_sizes[i] = sorted(sizes, reverse=True)
+            if self.encoding == "order":
+                continue  # the ladders already select one bound of each side
 
-            l_vars = [l(i,j) for j in range(len(d))]
-            u_vars = [u(i,k) for k in range(len(d))]
+            lower, upper = self._bound_ranges(i)
+            l_vars = [l(i,j) for j in lower]
+            u_vars = [u(i,k) for k in upper]
             self.constraints.append(f"sum({l_vars}) = 1")
             self.constraints.append(f"sum({u_vars}) = 1")
             for b_vars in (l_vars, u_vars):
@@ -109,9 +143,8 @@ class SeedGenerator:
         while 1/factor in all_intervals:
             factor += 1
         for i in self.fs_info.keys():
-            d = self.fs_info.get_domain(i)
             soft[i] = []
-            for (j, k) in combinations(range(len(d)), 2):
+            for (j, k) in self._intervals(i):
                 soft[i].append(I(i,j,k))
                 self.weights[I(i,j,k)] = -w(i,j,k, factor)  # -ve so ModHitman maximises hs weight
         self.to_hit = soft.values()
@@ -136,6 +169,11 @@ class SeedGenerator:
     def must_contain(self, r: Region):
         l, u, I = self._get_index_functions()
         d_idx = self._region_to_didx(r)
+        if self.encoding == "order":
+            cnf = self.order.must_contain(d_idx, self.fs_info.domains)
+            self.constraints += cnf
+            self._extend_hitman(cnf)
+            return
         to_conjunct = []
         for i in d_idx.keys():
             d = self.fs_info.get_domain(i)
@@ -144,11 +182,16 @@ class SeedGenerator:
             to_conjunct.append(Or([l(i,j) for j in range(l_idx+1)]))
             to_conjunct.append(Or([u(i,k) for k in range(u_idx, len(d))]))
         self.constraints.append(And(to_conjunct))
-        self._extend_hitman(And(to_conjunct).to_cnf())
+        self._extend_hitman(And(to_conjunct).to_cnf(self.vpool))
 
     def block_up(self, r: Region):
         l, u, I = self._get_index_functions()
         d_idx = self._region_to_didx(r)
+        if self.encoding == "order":
+            cnf = [self.order.block_up(d_idx, self.fs_info.domains)]
+            self.constraints += cnf
+            self._extend_hitman(cnf)
+            return
         to_disjunct = []
         for i in d_idx.keys():
             d = self.fs_info.get_domain(i)
@@ -159,11 +202,16 @@ class SeedGenerator:
             if u_idx > 0:
                 to_disjunct.append(Or([u(i,k) for k in range(u_idx)]))
         self.constraints.append(Or(to_disjunct))
-        self._extend_hitman(Or(to_disjunct).to_cnf())
+        self._extend_hitman(Or(to_disjunct).to_cnf(self.vpool))
 
     def block_down(self, r: Region):
         l, u, I = self._get_index_functions()
         d_idx = self._region_to_didx(r)
+        if self.encoding == "order":
+            cnf = [self.order.block_down(d_idx, self.fs_info.domains)]
+            self.constraints += cnf
+            self._extend_hitman(cnf)
+            return
         to_disjunct = []
         for i in d_idx.keys():
             d = self.fs_info.get_domain(i)
@@ -174,7 +222,7 @@ class SeedGenerator:
             if u_idx < len(d)-1:
                 to_disjunct.append(Or([u(i,k) for k in range(u_idx+1, len(d))]))
         self.constraints.append(Or(to_disjunct))
-        self._extend_hitman(Or(to_disjunct).to_cnf())
+        self._extend_hitman(Or(to_disjunct).to_cnf(self.vpool))
     
     def _print_constraints(self):
         for c in self.constraints:
@@ -191,13 +239,23 @@ class SeedGenerator:
         for clause in self._to_atoms(cnf):
             self.hitman.add_hard(clause)
 
+    def _bound_ranges(self, i):
+        """Indices that can be the lower and upper bound of feature i."""
+        m = len(self.fs_info.get_domain(i))
+        if i not in self.instance:
+            return range(m), range(m)
+        l_idx, u_idx = self.instance[i]
+        return range(l_idx+1), range(u_idx, m)
+
+    def _intervals(self, i):
+        """Index pairs (j, k) of the intervals of feature i seeds can use."""
+        lower, upper = self._bound_ranges(i)
+        m = len(self.fs_info.get_domain(i))
+        return [(j, k) for (j, k) in combinations(range(m), 2) if j in lower and k in upper]
+
     def _region_to_didx(self, r: Region):
-        l, u, I = self._get_index_functions()
-        d_idx = {}
-        for i, b in r.bounds.items(): 
-            d = self.fs_info.get_domain(i)
-            d_idx[i] = (d.index(b[0]), d.index(b[1]))
-        return d_idx
+        """{feature_id: (lower index, upper index)} of the features r bounds."""
+        return self.fs_info.index_region(r).index_bounds()
     
     def _get_index_functions(self):
         l = lambda i, j: self.vpool.id(f"l_{i}_{j}")
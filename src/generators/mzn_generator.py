@@ -51,19 +51,19 @@ class SeedGenerator:
 
     def must_contain(self, r: Region):
         for f_id, b in r.bounds.items():
-            d = self.fs_info.get_domain(f_id)
+            d = self.fs_info.domain_index[f_id]
             self.instance.add_string(
                 f"""
-                constraint x{f_id}l <= {d.index(b[0])};
-                constraint x{f_id}u >= {d.index(b[1])};
+                constraint x{f_id}l <= {d[b[0]]};
+                constraint x{f_id}u >= {d[b[1]]};
                 """
             )
 
     def block_up(self, r: Region):
         c = "constraint "
         for f_id, b in r.bounds.items():
-            d = self.fs_info.get_domain(f_id)
-            c += f"(x{f_id}l > {d.index(b[0])}) \/ (x{f_id}u < {d.index(b[1])}) \/ "
+            d = self.fs_info.domain_index[f_id]
+            c += f"(x{f_id}l > {d[b[0]]}) \/ (x{f_id}u < {d[b[1]]}) \/ "
         c = c[:-4] + ";\n"  # Remove final \/
         self.instance.add_string(c)
         self.blocked_up.append(r)
@@ -71,8 +71,8 @@ class SeedGenerator:
     def block_down(self, r: Region):
         c = "constraint "
         for f_id, b in r.bounds.items():
-            d = self.fs_info.get_domain(f_id)
-            c += f"(x{f_id}l < {d.index(b[0])}) \/ (x{f_id}u > {d.index(b[1])}) \/ "
+            d = self.fs_info.domain_index[f_id]
+            c += f"(x{f_id}l < {d[b[0]]}) \/ (x{f_id}u > {d[b[1]]}) \/ "
         c = c[:-4] + ";\n"  # Remove final \/
         self.instance.add_string(c)
         self.blocked_down.append(r)
\ No newline at end of file
@@ -12,36 +12,76 @@ from pysat.allies.approxmc import Counter
 
 from src.regions import Region
 from src.utils.sat_shortcuts import *
+from src.utils.order_encoding import OrderEncoding
 
 
 class SeedGenerator:
     """
     Generate unblocked seed with maximum volume.
     """
-    def __init__(self, fs_info, solver="g4"):
+    # Attributes holding the initial formula, saved by cnf_state()
+    _cnf_attrs = ("vpool", "wcnf", "interval_sizes", "encoding")
+    # The order encoding only defines the I_ijk that have soft clauses
+    _define_all_intervals = True
+    # Rebuild the oracle once it holds this many times the totalizer sums
+    # it had after its first solve
+    _rebuild_growth = 2
+
+    def __init__(self, fs_info, solver="g4", cnf_state=None, encoding="direct", instance=None):
+        """
+        cnf_state: dict from cnf_state() of a fresh generator over the same
+            feature space, used instead of building the formula again. Its
+            encoding replaces the encoding argument.
+        encoding: "direct" bounds each interval with clauses over the
+            one-hot bound variables, quadratic in the domain size. "order"
+            uses the linear ladder encoding of OrderEncoding.
+        instance: Region every seed must contain, usually the cell of the
+            instance being explained. Only intervals containing it get
+            variables and soft clauses, which has the effect of
+            must_contain(instance) on a much smaller formula.
+        """
+        if encoding not in ("direct", "order"):
+            raise ValueError(f"{encoding} not a valid bound encoding")
+        if cnf_state is not None and instance is not None:
+            raise ValueError("cnf_state is built without an instance")
         self.fs_info = fs_info
         self.vpool = IDPool(start_from=1)
         self.wcnf = WCNFPlus()
         self.solver = solver
+        self.encoding = encoding
+        self.order = OrderEncoding(self.vpool)
         self.interval_sizes = {}
         self.constraints = []
+        self.instance = {} if instance is None else self._region_to_didx(instance)
 
-        self._init_hard_bounds()
-        self._init_hard_intervals()
-        self._init_soft()
-        self.rc2 = RC2(
-            self.wcnf, 
-            solver=solver, 
-            adapt=True,
-            exhaust=True,
-            incr=True,
-            minz=True,
-        )
+        if cnf_state is not None:
+            for name in self._cnf_attrs:
+                setattr(self, name, cnf_state[name])
+            top, obj2id = cnf_state["vpool"]
+            self.vpool = IDPool(start_from=top+1)
+            self.vpool.obj2id.update(obj2id)
+            self.vpool.id2obj = {v: k for k, v in obj2id.items()}
+            self.order = OrderEncoding(self.vpool)
+        else:
+            self._init_hard_bounds()
+            self._init_hard_intervals()
+            self._init_soft()
+        self.rc2 = self._new_rc2()
+        # number of totalizer sums after the first solve on the current oracle
+        self.fresh_sums = None
+        self.n_rebuilds = 0
 
         self.n_vars = len(self.vpool.obj2id.keys())
         self.n_clauses = len(self.wcnf.hard) + len(self.wcnf.soft)
         # self._print_constraints()
     
+    def cnf_state(self) -> dict:
+        """The initial formula, to pass as cnf_state to a new generator."""
+        state = {name: getattr(self, name) for name in self._cnf_attrs}
+        # IDPool holds a lambda, so keep only its mapping
+        state["vpool"] = (self.vpool.top, dict(self.vpool.obj2id))
+        return state
+
     def _init_hard_bounds(self):
         l, u, I = self._get_index_functions()
         for i in self.fs_info.keys():
@@ -49,6 +89,23 @@ class SeedGenerator:
             for j in range(len(d)):
                 l(i,j)  # l_ij <-> d[j] is lower bound
                 u(i,j)  # u_ij <-> d[j] is upper bound
+            if self.encoding == "order":
+                bounds = self.order.bounds(i, len(d), l, u)
+                if i in self.instance:
+                    bounds += self.order.must_contain({i: self.instance[i]}, self.fs_info.domains)
+                self.constraints += bounds
+                self.wcnf.extend(bounds)
+                continue
+            if i in self.instance:
+                # Bounds either side of the instance are always ordered, so
+                # excluding the others replaces the l < u clauses
+                lower, upper = self._bound_ranges(i)
+                for j in range(len(d)):
+                    if j not in lower:
+                        self.wcnf.append([-l(i,j)])
+                    if j not in upper:
+                        self.wcnf.append([-u(i,j)])
+                continue
             self.wcnf.append([-l(i,len(d)-1)])  # Lower bound can't be highest threshold
             self.constraints.append(f"~{l(i,len(d)-1)}")
             self.wcnf.append([-u(i,0)])  # Upper bound can't be lowest threshold
@@ -73,15 +130,22 @@ class SeedGenerator:
         for i in self.fs_info.keys():
             d = self.fs_info.get_domain(i)
             sizes = []
-            for (j, k) in combinations(range(len(d)), 2):
+            for (j, k) in self._intervals(i):
                 I(i,j,k)  # I_ijk <-> interval is (d[j], d[k])
+                sizes.append(d[k]-d[j])
+                if self.encoding == "order":
+                    if self._define_all_intervals:
+                        self.wcnf.extend(self.order.interval(l(i,j), u(i,k), I(i,j,k)))
+                    continue
                 constraint = Iff(And([l(i,j),u(i,k)]), I(i,j,k))
                 self.constraints.append(constraint)
                 self.wcnf.extend(constraint.to_cnf())  # (l_ij ^ u_ik) <-> I_ijk
-                sizes.append(d[k]-d[j])
             self.interval_sizes[i] = sorted(sizes, reverse=True)
-            l_vars = [l(i,j) for j in range(len(d))]
-            u_vars = [u(i,k) for k in range(len(d))]
+            if self.encoding == "order":
+                continue  # the ladders already select one bound of each side
+            lower, upper = self._bound_ranges(i)
+            l_vars = [l(i,j) for j in lower]
+            u_vars = [u(i,k) for k in upper]
             self.constraints.append(f"sum({l_vars}) = 1")
             self.constraints.append(f"sum({u_vars}) = 1")
             for b_vars in (l_vars, u_vars):
@@ -100,58 +164,78 @@ class SeedGenerator:
         while 1/factor in all_intervals:
             factor += 1
         for i in self.fs_info.keys():
-            d = self.fs_info.get_domain(i)
-            for (j, k) in combinations(range(len(d)), 2):
+            for (j, k) in self._intervals(i):
                 self.wcnf.append([I(i,j,k)], weight=w(i,j,k, factor))
 
-    def get_seed(self) -> Region:
-        with RC2(
+    def _new_rc2(self):
+        return RC2(
             self.wcnf, 
             solver=self.solver, 
             adapt=True,
             exhaust=True,
             incr=True,
             minz=True,
-        ) as solver:
-            model = solver.compute()
-            if model is None:
-                logging.info("UNSAT")
-                solver.get_core()
-                logging.info(f"UNSAT Core: {solver.core}")
-                return None
-
-            is_used_interval = lambda x: self.vpool.obj(x) and "I" in self.vpool.obj(x)
-            intervals = [self.vpool.obj(x) for x in model if is_used_interval(x)]
-            bounds = {}
-            for I in intervals:
-                I = I.split("_")
-                f_id = int(I[1])
-                l_idx = int(I[2])
-                u_idx = int(I[3])
-                d = self.fs_info.get_domain(f_id)
-                bounds[f_id] = (d[l_idx], d[u_idx])
-            return Region(bounds)
-        # model = self.rc2.compute()
-        # if model is None:
-            # logging.info("UNSAT")
-            # self.rc2.get_core()
-            # logging.info(f"UNSAT Core: {self.rc2.core}")
-            # return None
-        # is_used_interval = lambda x: self.vpool.obj(x) and "I" in self.vpool.obj(x)
-        # intervals = [self.vpool.obj(x) for x in model if is_used_interval(x)]
-        # bounds = {}
-        # for I in intervals:
-            # I = I.split("_")
-            # f_id = int(I[1])
-            # l_idx = int(I[2])
-            # u_idx = int(I[3])
-            # d = self.fs_info.get_domain(f_id)
-            # bounds[f_id] = (d[l_idx], d[u_idx])
-        # return Region(bounds)
+        )
+
+    def get_seed(self) -> Region:
+        """
+        Solve on the long-lived oracle. Blocking clauses reach it through
+        _extend_rc2 as hard clauses, so its cores, relaxations and learned
+        clauses stay valid and each call resumes where the last stopped.
+
+        Relaxations pile up across calls, though, and with many distinct
+        weights a live solve can end up slower than starting over. Once the
+        oracle holds _rebuild_growth times the totalizer sums it had after
+        its first solve, it is rebuilt from self.wcnf, which holds every
+        clause. The trigger only counts solver state, so runs stay
+        reproducible.
+        """
+        model = self._compute()
+        self._check_growth()
+        if model is None:
+            logging.info("UNSAT")
+            return None
+        return self._model_to_region(model)
+
+    def _compute(self):
+        model = self.rc2.compute()
+        # AtMost1 groups are adapted on the first call only
+        self.rc2.adapt = False
+        return model
+
+    def _check_growth(self):
+        """Rebuild the oracle if it has grown too much since its first solve."""
+        n_sums = len(self.rc2.sums)
+        if self.fresh_sums is None:
+            self.fresh_sums = max(n_sums, 1)
+        elif n_sums > self._rebuild_growth * self.fresh_sums:
+            self._rebuild_rc2()
+
+    def _rebuild_rc2(self):
+        self.rc2.delete()
+        self.rc2 = self._new_rc2()
+        self.fresh_sums = None
+        self.n_rebuilds += 1
+
+    def _model_to_region(self, model) -> Region:
+        is_used_interval = lambda x: self.vpool.obj(x) and "I" in self.vpool.obj(x)
+        intervals = [self.vpool.obj(x) for x in model if is_used_interval(x)]
+        bounds = {}
+        for I in intervals:
+            I = I.split("_")
+            f_id = int(I[1])
+            l_idx = int(I[2])
+            u_idx = int(I[3])
+            d = self.fs_info.get_domain(f_id)
+            bounds[f_id] = (d[l_idx], d[u_idx])
+        return Region(bounds)
 
     def must_contain(self, r: Region):
         l, u, I = self._get_index_functions()
         d_idx = self._region_to_didx(r)
+        if self.encoding == "order":
+            self._add_hard(self.order.must_contain(d_idx, self.fs_info.domains))
+            return
         to_conjunct = []
         for i in d_idx.keys():
             d = self.fs_info.get_domain(i)
@@ -160,12 +244,16 @@ class SeedGenerator:
             to_conjunct.append(Or([l(i,j) for j in range(l_idx+1)]))
             to_conjunct.append(Or([u(i,k) for k in range(u_idx, len(d))]))
         self.constraints.append(And(to_conjunct))
-        self.wcnf.extend(And(to_conjunct).to_cnf()) 
-        self._extend_rc2(And(to_conjunct).to_cnf())
+        cnf = And(to_conjunct).to_cnf(self.vpool)
+        self.wcnf.extend(cnf)
+        self._extend_rc2(cnf)
 
     def block_up(self, r: Region):
         l, u, I = self._get_index_functions()
         d_idx = self._region_to_didx(r)
+        if self.encoding == "order":
+            self._add_hard([self.order.block_up(d_idx, self.fs_info.domains)])
+            return
         to_disjunct = []
         for i in d_idx.keys():
             d = self.fs_info.get_domain(i)
@@ -176,12 +264,16 @@ class SeedGenerator:
             if u_idx > 0:
                 to_disjunct.append(Or([u(i,k) for k in range(u_idx)]))
         self.constraints.append(Or(to_disjunct))
-        self.wcnf.extend(Or(to_disjunct).to_cnf()) 
-        self._extend_rc2(Or(to_disjunct).to_cnf())
+        cnf = Or(to_disjunct).to_cnf(self.vpool)
+        self.wcnf.extend(cnf)
+        self._extend_rc2(cnf)
 
     def block_down(self, r: Region):
         l, u, I = self._get_index_functions()
         d_idx = self._region_to_didx(r)
+        if self.encoding == "order":
+            self._add_hard([self.order.block_down(d_idx, self.fs_info.domains)])
+            return
         to_disjunct = []
         for i in d_idx.keys():
             d = self.fs_info.get_domain(i)
@@ -192,8 +284,9 @@ class SeedGenerator:
             if u_idx < len(d)-1:
                 to_disjunct.append(Or([u(i,k) for k in range(u_idx+1, len(d))]))
         self.constraints.append(Or(to_disjunct))
-        self.wcnf.extend(Or(to_disjunct).to_cnf()) 
-        self._extend_rc2(Or(to_disjunct).to_cnf())
+        cnf = Or(to_disjunct).to_cnf(self.vpool)
+        self.wcnf.extend(cnf)
+        self._extend_rc2(cnf)
     
     def _print_constraints(self):
         for c in self.constraints:
@@ -206,17 +299,32 @@ class SeedGenerator:
         pattern = re.compile(r'\b(' + '|'.join(keys) + r')\b')
         print(pattern.sub(lambda x: d[x.group()], s))
     
+    def _add_hard(self, cnf):
+        self.constraints += cnf
+        self.wcnf.extend(cnf)
+        self._extend_rc2(cnf)
+
     def _extend_rc2(self, cnf):
         for clause in cnf:
             self.rc2.add_clause(clause)
 
+    def _bound_ranges(self, i):
+        """Indices that can be the lower and upper bound of feature i."""
+        m = len(self.fs_info.get_domain(i))
+        if i not in self.instance:
+            return range(m), range(m)
+        l_idx, u_idx = self.instance[i]
+        return range(l_idx+1), range(u_idx, m)
+
+    def _intervals(self, i):
+        """Index pairs (j, k) of the intervals of feature i seeds can use."""
+        lower, upper = self._bound_ranges(i)
+        m = len(self.fs_info.get_domain(i))
+        return [(j, k) for (j, k) in combinations(range(m), 2) if j in lower and k in upper]
+
     def _region_to_didx(self, r: Region):
-        l, u, I = self._get_index_functions()
-        d_idx = {}
-        for i, b in r.bounds.items(): 
-            d = self.fs_info.get_domain(i)
-            d_idx[i] = (d.index(b[0]), d.index(b[1]))
-        return d_idx
+        """{feature_id: (lower index, upper index)} of the features r bounds."""
+        return self.fs_info.index_region(r).index_bounds()
     
     def _get_index_functions(self):
         l = lambda i, j: self.vpool.id(f"l_{i}_{j}")
@@ -5,7 +5,6 @@ from math import log, isclose
 from itertools import combinations
 from decimal import Decimal
 
-from pysat.card import CardEnc
 from pysat.examples.rc2 import RC2
 
 from src.regions import Region
@@ -17,11 +16,15 @@ class SeedGenerator(RC2Generator):
     """
     Generate unblocked seed with maximum volume.
     """
-    def __init__(self, fs_info, solver="g4"):
+    _cnf_attrs = RC2Generator._cnf_attrs + ("active_softs", "factor")
+    _define_all_intervals = False
+
+    def __init__(self, fs_info, solver="g4", cnf_state=None, encoding="direct", instance=None):
         self.active_softs = {}
-        self.card_encs = {}
         self.factor = 1
-        super().__init__(fs_info, solver=solver)
+        super().__init__(
+            fs_info, solver=solver, cnf_state=cnf_state, encoding=encoding, instance=instance
+        )
 
     def _init_soft(self):
         """Create list of soft clauses instead of immediately adding all of them"""
@@ -42,25 +45,21 @@ class SeedGenerator(RC2Generator):
             for (j, k) in combinations(range(len(d)), 2):
                 if j == 0 and k == len(d)-1:
                     self._add_soft(i,j,k)
-                    self.card_encs[i] = [[I(i,j,k)]]
 
-    def _expand_softs(self, r_intervals):
+    def _expand_softs(self, r: Region) -> bool:
+        """Activate the two intervals one step inside each of r's intervals."""
         l, u, I = self._get_index_functions()
-        for interval in r_intervals:
-            i_components = interval.split("_")
-            f_id = int(i_components[1])
-            l_idx = int(i_components[2])
-            u_idx = int(i_components[3])
-            reset_cardenc = False
+        expanded = False
+        for f_id, (l_idx, u_idx) in self._region_to_didx(r).items():
+            lower, upper = self._bound_ranges(f_id)
             if u_idx - l_idx > 1:
-                if I(f_id,l_idx+1,u_idx) not in self.active_softs[f_id]:
+                if l_idx+1 in lower and I(f_id,l_idx+1,u_idx) not in self.active_softs[f_id]:
                     self._add_soft(f_id,l_idx+1,u_idx)
-                    reset_cardenc = True
-                if I(f_id,l_idx,u_idx-1) not in self.active_softs[f_id]:
+                    expanded = True
+                if u_idx-1 in upper and I(f_id,l_idx,u_idx-1) not in self.active_softs[f_id]:
                     self._add_soft(f_id,l_idx,u_idx-1)
-                    reset_cardenc = True
-            if reset_cardenc:
-                self._reset_cardenc(f_id)
+                    expanded = True
+        return expanded
     
     def _add_soft(self, i, j, k):
         def w(i, j, k, factor):
@@ -70,15 +69,18 @@ class SeedGenerator(RC2Generator):
             return Decimal(log(i_size)) + Decimal(log(factor)) - Decimal(log(d_size))
 
         l, u, I = self._get_index_functions()
+        if self.encoding == "order":
+            self.wcnf.extend(self.order.interval(l(i,j), u(i,k), I(i,j,k)))
         self.wcnf.append([I(i,j,k)], weight=w(i,j,k, self.factor))
         self.active_softs[i].add(I(i,j,k))
 
-    def _reset_cardenc(self, i):
-        card_cnf = CardEnc.equals(self.active_softs[i], vpool=self.vpool).clauses
-        self.card_encs[i] = card_cnf
-
-    def get_seed(self) -> Region:
-        with RC2(
+    def _new_rc2(self):
+        """
+        Oracle over the active intervals. The hard intervals already allow
+        exactly one I_ijk per feature, so restricting it to the active ones
+        takes a single clause per feature instead of a cardinality encoding.
+        """
+        rc2 = RC2(
             self.wcnf, 
             solver=self.solver, 
             adapt=True,
@@ -86,25 +88,28 @@ class SeedGenerator(RC2Generator):
             incr=True,
             minz=True,
             trim=True,
-        ) as solver:
-            for f_id in self.card_encs.keys():
-                for c in self.card_encs[f_id]:
-                    solver.add_clause(c)
-            model = solver.compute()
-            if model is None:
-                return None
-            is_used_interval = lambda x: self.vpool.obj(x) and "I" in self.vpool.obj(x)
-            intervals = [self.vpool.obj(x) for x in model if is_used_interval(x)]
-            self._expand_softs(intervals)
-            bounds = {}
-            for I in intervals:
-                I = I.split("_")
-                f_id = int(I[1])
-                l_idx = int(I[2])
-                u_idx = int(I[3])
-                d = self.fs_info.get_domain(f_id)
-                bounds[f_id] = (d[l_idx], d[u_idx])
-        return Region(bounds)
+        )
+        for f_id in self.active_softs.keys():
+            rc2.add_clause(sorted(self.active_softs[f_id]))
+        return rc2
+
+    def get_seed(self) -> Region:
+        """
+        Seeds come from the live oracle while the active intervals stay the
+        same. Activating an interval weakens the formula, which would
+        invalidate the oracle's cores, so an expansion rebuilds it, in place
+        of the rebuild on growth rather than after it.
+        """
+        model = self._compute()
+        if model is None:
+            logging.info("UNSAT")
+            return None
+        r = self._model_to_region(model)
+        if self._expand_softs(r):
+            self._rebuild_rc2()
+        else:
+            self._check_growth()
+        return r
 
     def block_up(self, r):
         super().block_up(r)
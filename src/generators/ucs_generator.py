@@ -1,109 +1,141 @@
 import heapq
+import logging
 import numpy as np
 from math import log
-from decimal import Decimal
 from itertools import combinations
 
 from ..regions import Region
-from ..utils.np_regionlist import NpRegionList
+from ..utils.dominance_index import DominanceIndex
 
 
 class SeedGenerator:
-    def __init__(self, fs_info):
+    def __init__(self, fs_info, max_frontier=None, instance=None):
+        """
+        max_frontier: most entries kept on the search frontier. When it
+            fills up the worst half is dropped along with every seed only
+            reachable through them, so seeds no longer come out in score
+            order and get_seed may return None before the search space is
+            exhausted. truncated then tells the search was incomplete.
+            None keeps every entry.
+        instance: Region every seed must contain. Pairs not containing it
+            are left out of the search instead of being skipped by
+            must_contain.
+        """
+        self.fs_info = fs_info
         self.active_features = np.array(list(fs_info.active_features))
-        self.seen = set()
         self.pairs = {
             f_id: sorted([(c[1]-c[0], c[0], c[1]) for c in combinations(d, 2)], reverse=True)
             for f_id, d in fs_info.domains.items()
         }
+        if instance is not None:
+            for f_id, (lower, upper) in instance.bounds.items():
+                self.pairs[f_id] = [p for p in self.pairs[f_id] if p[1] <= lower and p[2] >= upper]
+        n_pairs = [len(self.pairs[f_id]) for f_id in fs_info.features]
+        # domain positions of each pair, flattened in the order of fs_info.features
+        self.pair_offsets = np.concatenate([[0], np.cumsum(n_pairs)[:-1]]).astype(np.int64)
+        pair_pos = np.array([
+            (fs_info.domain_index[f_id][p[1]], fs_info.domain_index[f_id][p[2]])
+            for f_id in fs_info.features for p in self.pairs[f_id]
+        ], dtype=np.int64)
+        self.pair_lo, self.pair_hi = pair_pos[:, 0], pair_pos[:, 1]
 
-        r_idxs = {f_id: 0 for f_id in self.pairs.keys()}
-        self.seen.add(tuple(i for i in r_idxs.values()))
-        self.ridxs_heap = [(self._heapscore(r_idxs), 0, r_idxs)]
-        self.obj_id = 1
+        # Score increase of moving feature k from pair i to pair i+1. Widths
+        # are sorted descending, so every step is non-negative.
+        log_widths = [[log(p[0]) for p in self.pairs[f_id]] for f_id in fs_info.features]
+        self.steps = [[lw[i] - lw[i+1] for i in range(len(lw)-1)] for lw in log_widths]
+        self.n_pairs = n_pairs
 
+        # Frontier entries pack the pair index of every feature into one int
+        # key, with a fixed digit width so keys decode as a NumPy buffer.
+        digit_bits = max(n - 1 for n in n_pairs).bit_length()
+        self.digit_bytes = next(b for b in (1, 2, 4, 8) if 8*b >= digit_bits)
+        self.digit_dtype = np.dtype(f"<u{self.digit_bytes}")
+        self.digit_shift = 8*self.digit_bytes
+
+        self.max_frontier = max_frontier
+        self.truncated = False
+        # (score, key, last) where last is the highest feature already
+        # advanced. Successors only advance features from last onwards, so
+        # every index tuple has exactly one parent and is pushed once.
+        self.frontier = [(-sum(lw[0] for lw in log_widths), 0, 0)]
+
+        sizes = [len(fs_info.domains[f_id]) for f_id in fs_info.features]
         self.instance = None
-        self.blocked_down = None
-        self.blocked_up = None
+        self.blocked_down = DominanceIndex(sizes, mode="down")
+        self.blocked_up = DominanceIndex(sizes, mode="up")
 
     def get_seed(self):
-        r = self._get_seed()
-        while r is not None and self._blocked(r):
-            r = self._get_seed()
-        return r
+        idx = self._get_seed()
+        while idx is not None and self._blocked(idx):
+            idx = self._get_seed()
+        return None if idx is None else self._idx_to_r(idx)
 
     def _get_seed(self):
-        if len(self.ridxs_heap) == 0:
+        if len(self.frontier) == 0:
             return None
-        best_ridxs = heapq.heappop(self.ridxs_heap)[2]
-        for f_id in self.pairs.keys():
-            if best_ridxs[f_id] == len(self.pairs[f_id]) - 1:
+        score, key, last = heapq.heappop(self.frontier)
+        idx = self._decode(key)
+        for k in range(last, len(self.n_pairs)):
+            i = int(idx[k])
+            if i == self.n_pairs[k] - 1:
                 continue
-            new_ridxs = best_ridxs.copy()
-            new_ridxs[f_id] += 1
-            r_enc = tuple(i for i in new_ridxs.values())
-            if not r_enc in self.seen:
-                self.seen.add(r_enc)
-                heapq.heappush(
-                    self.ridxs_heap, 
-                    (self._heapscore(new_ridxs), self.obj_id, new_ridxs)
-                )
-                self.obj_id += 1
-        return self._ridx_to_r(best_ridxs)
-
-    def _ridx_to_r(self, ridx):
+            heapq.heappush(
+                self.frontier,
+                (score + self.steps[k][i], key + (1 << (k*self.digit_shift)), k)
+            )
+        if self.max_frontier is not None and len(self.frontier) > self.max_frontier:
+            self._truncate()
+        return idx
+
+    def _truncate(self):
+        if not self.truncated:
+            logging.warning(
+                f"ucs frontier exceeded {self.max_frontier} entries, the search is no longer complete"
+            )
+            self.truncated = True
+        self.frontier = heapq.nsmallest(self.max_frontier // 2, self.frontier)
+        heapq.heapify(self.frontier)
+
+    def _decode(self, key):
+        """Pair index of every feature packed into key."""
+        n = len(self.n_pairs)
+        return np.frombuffer(key.to_bytes(n*self.digit_bytes, "little"), dtype=self.digit_dtype)
+
+    def _idx_to_r(self, idx):
         return Region({
-            f_id: (self.pairs[f_id][pair_i][1], self.pairs[f_id][pair_i][2])
-            for f_id, pair_i in ridx.items()
+            f_id: (self.pairs[f_id][i][1], self.pairs[f_id][i][2])
+            for f_id, i in zip(self.fs_info.features, idx.tolist())
         })
-    
+
     def must_contain(self, r):
-        self.instance = r.to_numpy(self.active_features)
-    
+        lo, hi = self._positions(r)
+        # unbounded instance features constrain nothing
+        self.instance = (
+            np.where(lo < 0, np.iinfo(np.int64).max, lo),
+            np.where(hi < 0, -1, hi)
+        )
+
     def block_up(self, r):
-        r = r.to_numpy(self.active_features)
-        if self.blocked_up is None:
-            self.blocked_up = NpRegionList(r.shape)
-        self.blocked_up.add(r)
+        self.blocked_up.add(*self._positions(r))
 
     def block_down(self, r):
-        r = r.to_numpy(self.active_features)
-        if self.blocked_down is None:
-            self.blocked_down = NpRegionList(r.shape)
-        self.blocked_down.add(r)
-
-    def _heapscore(self, r_idxs):
-        return -sum([
-            Decimal(log(self.pairs[f_id][pair_i][0]))
-            for f_id, pair_i in r_idxs.items()
-        ])
-    
-    def _blocked(self, r):
-        """Checks whether or not a region is blocked via numpy vectorisation"""
-        r = r.to_numpy()
+        self.blocked_down.add(*self._positions(r))
+
+    def _positions(self, r):
+        """Domain positions of r per feature, -1 where r has no bound."""
+        lo = np.full(len(self.fs_info.features), -1, dtype=np.int64)
+        hi = np.full(len(self.fs_info.features), -1, dtype=np.int64)
+        for f_id, (lower, upper) in r.bounds.items():
+            k = self.fs_info.feature_pos[f_id]
+            lo[k] = self.fs_info.domain_index[f_id][lower]
+            hi[k] = self.fs_info.domain_index[f_id][upper]
+        return lo, hi
+
+    def _blocked(self, idx):
+        """Whether the candidate with pair indices idx is blocked"""
+        rows = self.pair_offsets + idx
+        lo, hi = self.pair_lo[rows], self.pair_hi[rows]
         if self.instance is not None:
-            contains = np.zeros_like(self.instance)
-            contains[:,0] = r[:,0] <= self.instance[:,0]
-            contains[:,1] = r[:,1] >= self.instance[:,1]
-            contains_instance = np.all(contains)
-            if not contains_instance:
-                return True
-        r_lb = r[:,0]
-        r_ub = r[:,1]
-        if self.blocked_up is not None and len(self.blocked_up) > 0:
-            bu_lb = self.blocked_up.data[:self.blocked_up.size,:,0]
-            bu_ub = self.blocked_up.data[:self.blocked_up.size,:,1]
-            blocked_up = np.zeros_like(self.blocked_up.data[:self.blocked_up.size,:,:])
-            blocked_up[:,:,0] = np.logical_or(r_lb <= bu_lb, bu_lb == -1)
-            blocked_up[:,:,1] = np.logical_or(r_ub >= bu_ub, bu_ub == -1)
-            if np.any(np.all(blocked_up, axis=(1,2))):
-                return True
-        if self.blocked_down is not None and len(self.blocked_down) > 0:
-            bd_lb = self.blocked_down.data[:self.blocked_down.size,:,0]
-            bd_ub = self.blocked_down.data[:self.blocked_down.size,:,1]
-            blocked_down = np.zeros_like(self.blocked_down.data[:self.blocked_down.size,:,:])
-            blocked_down[:,:,0] = np.logical_or(r_lb >= bd_lb, bd_lb == -1)
-            blocked_down[:,:,1] = np.logical_or(r_ub <= bd_ub, bd_ub == -1)
-            if np.any(np.all(blocked_down, axis=(1,2))):
+            if not (np.all(lo <= self.instance[0]) and np.all(hi >= self.instance[1])):
                 return True
-        return False
+        return self.blocked_up.query(lo, hi) or self.blocked_down.query(lo, hi)
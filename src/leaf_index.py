@@ -0,0 +1,144 @@
+import bisect
+
+import numpy as np
+
+from .regions import Region
+
+
+class LeafIndex:
+    """
+    Leaves of every tree as boxes over threshold cell indices.
+
+    Cell i of a feature with sorted thresholds t is the interval
+    [t[i-1], t[i]), with cell 0 below t[0] and cell len(t) above t[-1].
+    A box is an inclusive (lo, hi) range of cells per feature, so a leaf
+    reached by t[j] <= x < t[k] covers cells j+1 to k. Features without
+    thresholds have the single cell 0.
+    """
+    def __init__(self, model):
+        self.model = model
+        self.num_feature = model.num_feature
+        self.num_trees = model.num_trees
+        self.thresholds = [
+            model.thresholds.get(f_id, []) for f_id in range(self.num_feature)
+        ]
+        self.n_cells = np.array([len(ts) + 1 for ts in self.thresholds], dtype=np.int32)
+        self.split_features = np.array(sorted(model.thresholds.keys()), dtype=np.int64)
+
+        self.boxes = []
+        self.weights = []
+        self.leaf_nodes = []
+        for tree in model.trees:
+            nodes, boxes, weights = [], [], []
+            for node_id, box in self._tree_leaves(tree):
+                nodes.append(node_id)
+                boxes.append(box)
+                weights.append(tree.split_condition(node_id))
+            self.leaf_nodes.append(np.array(nodes, dtype=np.int64))
+            self.boxes.append(np.array(boxes, dtype=np.int32).reshape(-1, self.num_feature, 2))
+            self.weights.append(np.array(weights, dtype=np.float64))
+        self.tree_group = np.array(model.tree_info[:self.num_trees], dtype=np.int64)
+
+        # All trees stacked, leaves of tree t in rows leaf_starts[t] onwards.
+        self.leaf_starts = np.cumsum([0] + [len(w) for w in self.weights[:-1]]).astype(np.int64)
+        self.leaf_tree = np.repeat(np.arange(self.num_trees), [len(w) for w in self.weights])
+        self.leaf_box = np.concatenate(self.boxes) if self.boxes else \
+            np.zeros((0, self.num_feature, 2), dtype=np.int32)
+        self.leaf_weight = np.concatenate(self.weights) if self.weights else \
+            np.zeros(0, dtype=np.float64)
+        self.leaf_group = self.tree_group[self.leaf_tree]
+        self.group_onehot = np.zeros(
+            (self.num_trees, int(self.tree_group.max(initial=0)) + 1), dtype=np.float64
+        )
+        self.group_onehot[np.arange(self.num_trees), self.tree_group] = 1
+
+        # Leaf boxes and thresholds of the split features only, laid out
+        # for queries of one box at a time.
+        self.split_lo = np.ascontiguousarray(self.leaf_box[:, self.split_features, 0])
+        self.split_hi = np.ascontiguousarray(self.leaf_box[:, self.split_features, 1])
+        counts = [len(self.thresholds[f_id]) for f_id in self.split_features]
+        self.flat_feature = np.repeat(self.split_features, counts)
+        self.flat_thresholds = np.array(
+            [t for f_id in self.split_features for t in self.thresholds[f_id]], dtype=np.float64
+        )
+        self.flat_starts = np.cumsum([0] + counts[:-1]).astype(np.int64)
+
+    def _tree_leaves(self, tree):
+        """Leaves of tree with their cell box, in depth-first order."""
+        leaves = []
+        box = [[0, len(ts)] for ts in self.thresholds]
+        stack = [(0, box)]
+        while stack:
+            node_id, box = stack.pop()
+            if tree.is_leaf(node_id):
+                leaves.append((node_id, box))
+                continue
+            f_id = tree.split_index(node_id)
+            j = self.thresholds[f_id].index(tree.split_condition(node_id))
+            left = [list(b) for b in box]
+            left[f_id][1] = min(box[f_id][1], j)
+            right = [list(b) for b in box]
+            right[f_id][0] = max(box[f_id][0], j+1)
+            stack.append((tree.right_child(node_id), right))
+            stack.append((tree.left_child(node_id), left))
+        return leaves
+
+    def region_box(self, r: Region):
+        """Cell box (num_feature, 2) covered by r; missing features are free."""
+        box = np.zeros((self.num_feature, 2), dtype=np.int32)
+        box[:, 1] = self.n_cells - 1
+        for f_id, (lower, upper) in r.bounds.items():
+            ts = self.thresholds[f_id]
+            box[f_id] = (bisect.bisect_right(ts, lower), bisect.bisect_left(ts, upper))
+        return box
+
+    def bounds_box(self, lower, upper):
+        """
+        Cell box (num_feature, 2) of the instances lower <= x < upper, where
+        lower and upper have one entry per feature and are -inf and inf on
+        unbounded features.
+        """
+        box = np.zeros((self.num_feature, 2), dtype=np.int32)
+        box[:, 1] = self.n_cells - 1
+        if len(self.split_features):
+            # the first cell of a bound is the number of thresholds below it
+            lower = np.asarray(lower, dtype=np.float64)[self.flat_feature]
+            upper = np.asarray(upper, dtype=np.float64)[self.flat_feature]
+            box[self.split_features, 0] = np.add.reduceat(self.flat_thresholds <= lower, self.flat_starts)
+            box[self.split_features, 1] = np.add.reduceat(self.flat_thresholds < upper, self.flat_starts)
+        return box
+
+    def region_boxes(self, regions: list[Region]):
+        """Cell boxes (n, num_feature, 2) of a list of regions."""
+        return np.array([self.region_box(r) for r in regions], dtype=np.int32) \
+            .reshape(-1, self.num_feature, 2)
+
+    def reachable(self, boxes):
+        """
+        Boolean matrix (n, n_leaves) of the leaves each of the n cell boxes
+        meets, over the stacked leaves of all trees.
+        """
+        boxes = np.asarray(boxes).reshape(-1, self.num_feature, 2)[:, self.split_features]
+        reach = np.empty((boxes.shape[0], len(self.leaf_weight)), dtype=bool)
+        for k, box in enumerate(boxes):
+            reach[k] = np.all((self.split_lo <= box[:, 1]) & (self.split_hi >= box[:, 0]), axis=1)
+        return reach
+
+    def weight_bounds(self, boxes):
+        """
+        Per-tree minimum and maximum weight over the leaves each cell box
+        meets, as two (n, num_trees) arrays.
+        """
+        reach = self.reachable(boxes)
+        w_min = np.minimum.reduceat(
+            np.where(reach, self.leaf_weight, np.inf), self.leaf_starts, axis=1
+        )
+        w_max = np.maximum.reduceat(
+            np.where(reach, self.leaf_weight, -np.inf), self.leaf_starts, axis=1
+        )
+        return w_min, w_max
+
+    def margin_bounds(self, boxes):
+        """Per-group margin bounds (n, num_groups) over each cell box."""
+        w_min, w_max = self.weight_bounds(boxes)
+        return w_min @ self.group_onehot, w_max @ self.group_onehot
@@ -4,66 +4,134 @@ support is experimental, output schema is subject to change in the future.
 
 Taken from xgboost/demo/json-model/json_parser.py
 '''
+import json
+
+import numpy as np
+
+from .leaf_index import LeafIndex
+from .utils import ubjson
+
+
+_POW10 = np.array([10.0 ** i for i in range(23)])
+
+
+def _as_float64(values):
+    '''
+    Split values as float64. Binary models store float32, which is widened
+    through its shortest round-tripping decimal, as XGBoost writes it in
+    JSON, so both formats load to the same model.
+    '''
+    values = np.asarray(values)
+    if values.dtype != np.float32:
+        return values.astype(np.float64)
+    wide = values.astype(np.float64)
+    out = wide.copy()
+    todo = np.flatnonzero(np.isfinite(wide) & (wide != 0))
+    exp = np.floor(np.log10(np.abs(wide[todo]))).astype(np.int64)
+    # Powers of ten are exact up to 1e22, which covers every candidate
+    # of values from 1e-14 to 1e22; the rest go through strings.
+    slow = todo[(exp < -14) | (exp > 22)]
+    out[slow] = values[slow].astype(str).astype(np.float64)
+    todo, exp = todo[(exp >= -14) & (exp <= 22)], exp[(exp >= -14) & (exp <= 22)]
+    for digits in range(1, 10):
+        places = digits - 1 - exp
+        w, p = wide[todo], _POW10[np.abs(places)]
+        cand = np.where(places >= 0, np.round(w * p) / p, np.round(w / p) * p)
+        done = cand.astype(np.float32) == values[todo]
+        out[todo[done]] = cand[done]
+        todo, exp = todo[~done], exp[~done]
+    out[todo] = values[todo].astype(str).astype(np.float64)
+    return out
+
 
 class Tree:
-    '''A tree built by XGBoost.'''
-    # Index into node array
+    '''A tree built by XGBoost, viewing its slice of the model arrays.'''
+    __slots__ = ("model", "tree_id", "offset", "n_nodes")
+
+    # Index into node rows
     _left = 0
     _right = 1
     _parent = 2
     _ind = 3
     _cond = 4
     _default_left = 5
-    # Index into stat array
+    # Index into stat rows
     _loss_chg = 0
     _sum_hess = 1
     _base_weight = 2
 
-    def __init__(self, tree_id: int, nodes, stats):
+    def __init__(self, model, tree_id: int, offset: int, n_nodes: int):
+        self.model = model
         self.tree_id = tree_id
-        self.nodes = nodes
-        self.stats = stats
+        self.offset = offset
+        self.n_nodes = n_nodes
+
+    def __len__(self):
+        return self.n_nodes
+
+    @property
+    def nodes(self):
+        '''Node rows [left, right, parent, split index, split value, default left].'''
+        m, s = self.model, slice(self.offset, self.offset + self.n_nodes)
+        return [list(row) for row in zip(
+            m.left[s].tolist(), m.right[s].tolist(), m.parent[s].tolist(),
+            m.split_indices[s].tolist(), m.split_conditions[s].tolist(),
+            m.default_left[s].tolist()
+        )]
+
+    @property
+    def stats(self):
+        '''Stat rows [loss change, sum hessian, base weight].'''
+        m, s = self.model, slice(self.offset, self.offset + self.n_nodes)
+        return [list(row) for row in zip(
+            m.loss_changes[s].tolist(), m.sum_hessian[s].tolist(),
+            m.base_weights[s].tolist()
+        )]
 
     def loss_change(self, node_id: int):
         '''Loss gain of a node.'''
-        return self.stats[node_id][self._loss_chg]
+        return float(self.model.loss_changes[self.offset + node_id])
 
     def sum_hessian(self, node_id: int):
         '''Sum Hessian of a node.'''
-        return self.stats[node_id][self._sum_hess]
+        return float(self.model.sum_hessian[self.offset + node_id])
 
     def base_weight(self, node_id: int):
         '''Base weight of a node.'''
-        return self.stats[node_id][self._base_weight]
+        return float(self.model.base_weights[self.offset + node_id])
 
     def split_index(self, node_id: int):
         '''Split feature index of node.'''
-        return self.nodes[node_id][self._ind]
+        return int(self.model.split_indices[self.offset + node_id])
 
     def split_condition(self, node_id: int):
         '''Split value of a node.'''
-        return self.nodes[node_id][self._cond]
+        return float(self.model.split_conditions[self.offset + node_id])
 
     def parent(self, node_id: int):
         '''Parent ID of a node.'''
-        return self.nodes[node_id][self._parent]
+        return int(self.model.parent[self.offset + node_id])
 
     def left_child(self, node_id: int):
         '''Left child ID of a node.'''
-        return self.nodes[node_id][self._left]
+        return int(self.model.left[self.offset + node_id])
 
     def right_child(self, node_id: int):
         '''Right child ID of a node.'''
-        return self.nodes[node_id][self._right]
+        return int(self.model.right[self.offset + node_id])
+
+    def default_left(self, node_id: int):
+        '''Whether missing values take the left branch.'''
+        return bool(self.model.default_left[self.offset + node_id])
 
     def is_leaf(self, node_id: int):
         '''Whether a node is leaf.'''
-        return self.nodes[node_id][self._left] == -1
+        return self.model.left[self.offset + node_id] == -1
 
     def is_deleted(self, node_id: int):
         '''Whether a node is deleted.'''
         # std::numeric_limits<uint32_t>::max()
-        return self.nodes[node_id][self._ind] == 4294967295
+        return self.model.split_indices[self.offset + node_id] == 4294967295
 
     def __str__(self):
         stacks = [0]
@@ -88,7 +156,11 @@ class Tree:
 
 
 class Model:
-    '''Gradient boosted tree model.'''
+    '''Gradient boosted tree model.
+
+    Nodes of all trees are stored field by field in flat arrays, tree i
+    owning rows node_starts[i] onwards, with node ids local to each tree.
+    '''
     def __init__(self, model: dict):
         '''Construct the Model from JSON object.
 
@@ -100,13 +172,14 @@ class Model:
         self.learner_model_shape = model['learner']['learner_model_param']
         self.num_output_group = int(self.learner_model_shape['num_class'])
         self.num_feature = int(self.learner_model_shape['num_feature'])
-        self.base_score = float(self.learner_model_shape['base_score'])
+        # XGBoost 2+ writes one base score per target as "[5E-1]"
+        self.base_score = float(
+            str(self.learner_model_shape['base_score']).strip('[]').split(',')[0]
+        )
         # A field encoding which output group a tree belongs
-        self.tree_info = model['learner']['gradient_booster']['model'][
-            'tree_info']
+        self.tree_info = [int(grp) for grp in model['learner']['gradient_booster'][
+            'model']['tree_info']]
         self.objective = model['learner']['objective']['name']
-        self.thresholds = {}
-
 
         model_shape = model['learner']['gradient_booster']['model'][
             'gbtree_model_param']
@@ -119,54 +192,118 @@ class Model:
         # self.leaf_size = int(model_shape['size_leaf_vector'])
         # Right now XGBoost doesn't support vector leaf yet
         # assert self.leaf_size == 0, str(self.leaf_size)
-
-        trees = []
         for i in range(self.num_trees):
-            tree = j_trees[i]
-            tree_id = int(tree['id'])
+            tree_id = int(j_trees[i]['id'])
             assert tree_id == i, (tree_id, i)
-            # properties
-            left_children = tree['left_children']
-            right_children = tree['right_children']
-            parents = tree['parents']
-            split_conditions = tree['split_conditions']
-            split_indices = tree['split_indices']
-            default_left = tree['default_left']
-            # stats
-            base_weights = tree['base_weights']
-            loss_changes = tree['loss_changes']
-            sum_hessian = tree['sum_hessian']
-
-            stats = []
-            nodes = []
-            # We resemble the structure used inside XGBoost, which is similar
-            # to adjacency list.
-            for node_id in range(len(left_children)):
-                split_ind = split_indices[node_id]
-                split_val = split_conditions[node_id]
-                nodes.append([
-                    left_children[node_id], right_children[node_id],
-                    parents[node_id], split_ind,
-                    split_val, default_left[node_id]
-                ])
-                stats.append([
-                    loss_changes[node_id], sum_hessian[node_id],
-                    base_weights[node_id]
+        self.set_trees(j_trees[:self.num_trees], self.tree_info[:self.num_trees])
+
+    @classmethod
+    def load(cls, path: str):
+        '''Load a model saved by XGBoost as .json or binary .ubj.'''
+        if path.endswith('.ubj'):
+            return cls(ubjson.load(path))
+        with open(path, 'r') as f:
+            return cls(json.load(f))
+
+    @classmethod
+    def from_booster(cls, booster):
+        '''Build the model from an in-memory xgboost Booster or XGBClassifier.'''
+        if hasattr(booster, 'get_booster'):
+            booster = booster.get_booster()
+        return cls(ubjson.loads(booster.save_raw('ubj')))
+
+    def set_trees(self, j_trees: list[dict], tree_info: list[int]):
+        '''
+        Replace the trees by j_trees, given in the XGBoost JSON tree schema.
+        The stat fields are optional and only read on first use.
+        '''
+        self.num_trees = len(j_trees)
+        self.tree_info = list(tree_info)
+        sizes = [len(tree['left_children']) for tree in j_trees]
+        self.node_starts = np.cumsum([0] + sizes[:-1]).astype(np.int64)
+
+        def field(name, dtype):
+            return np.concatenate(
+                [np.asarray(tree[name], dtype=dtype) for tree in j_trees]
+            ) if j_trees else np.zeros(0, dtype=dtype)
+        self.left = field('left_children', np.int32)
+        self.right = field('right_children', np.int32)
+        self.parent = field('parents', np.int32)
+        self.split_indices = field('split_indices', np.int64)
+        self.split_conditions = _as_float64(np.concatenate([
+            np.asarray(tree['split_conditions']) for tree in j_trees
+        ])) if j_trees else np.zeros(0)
+        self.default_left = field('default_left', np.int8)
+        # Stats are only converted on first use
+        self._stat_fields = [
+            [tree.get(name) for tree in j_trees]
+            for name in ('loss_changes', 'sum_hessian', 'base_weights')
+        ]
+        self._stats = None
+
+        # Distinct split values of each feature
+        internal = (self.left != -1) & (self.split_indices != 4294967295)
+        features = self.split_indices[internal]
+        values = self.split_conditions[internal]
+        order = np.lexsort((values, features))
+        features, values = features[order], values[order]
+        keep = np.ones(len(features), dtype=bool)
+        keep[1:] = (features[1:] != features[:-1]) | (values[1:] != values[:-1])
+        features, values = features[keep], values[keep]
+        f_ids, starts = np.unique(features, return_index=True)
+        ends = list(starts[1:]) + [len(features)]
+        # Features are keyed in the order they are first split on
+        _, first = np.unique(self.split_indices[internal], return_index=True)
+        self.thresholds = {
+            int(f_ids[i]): values[starts[i]:ends[i]].tolist()
+            for i in np.argsort(first, kind="stable")
+        }
+
+        self.trees = [
+            Tree(self, i, int(self.node_starts[i]), sizes[i]) for i in range(self.num_trees)
+        ]
+        self._leaf_index = None
+
+    def _load_stats(self):
+        if self._stats is None:
+            sizes = [tree.n_nodes for tree in self.trees]
+            self._stats = [
+                np.concatenate([np.zeros(0, dtype=np.float32)] + [
+                    np.asarray(values if values is not None else [0.0] * size, dtype=np.float32)
+                    for values, size in zip(fields, sizes)
                 ])
-                if not left_children[node_id] == -1:
-                    if not split_ind in self.thresholds.keys():
-                        self.thresholds[split_ind] = set([split_val])
-                    else:
-                        self.thresholds[split_ind].add(split_val)
+                for fields in self._stat_fields
+            ]
+            self._stat_fields = None
+        return self._stats
+
+    def __getstate__(self):
+        # convert the stats rather than pickling the lists they come from
+        self._load_stats()
+        return self.__dict__
+
+    @property
+    def loss_changes(self):
+        return self._load_stats()[0]
 
-            tree = Tree(tree_id, nodes, stats)
-            trees.append(tree)
+    @property
+    def sum_hessian(self):
+        return self._load_stats()[1]
 
-        for f_id in self.thresholds.keys():
-            self.thresholds[f_id] = sorted(list(self.thresholds[f_id]))
+    @property
+    def base_weights(self):
+        return self._load_stats()[2]
 
-        self.trees = trees
+    @property
+    def leaf_index(self):
+        '''Leaf boxes of all trees over threshold cell indices, built on first use.'''
+        return self.build_leaf_index()
 
+    def build_leaf_index(self):
+        '''Build the leaf index now, e.g. before pickling the model.'''
+        if self._leaf_index is None:
+            self._leaf_index = LeafIndex(self)
+        return self._leaf_index
 
     def print_model(self):
         for i, tree in enumerate(self.trees):
@@ -0,0 +1,120 @@
+import numpy as np
+
+from .model import Model
+
+
+class EnsemblePredictor:
+    """
+    Array-backed forward evaluation of a boosted tree ensemble.
+
+    Every tree is flattened into one struct-of-arrays node table, so a whole
+    batch of instances is routed through all trees at once. Leaves point to
+    themselves, which lets every instance take exactly max_depth steps.
+    """
+    def __init__(self, model: Model):
+        self.model = model
+        self.num_feature = model.num_feature
+        self.num_groups = max(model.tree_info) + 1
+
+        # Model arrays hold child ids local to each tree; shift them to
+        # global rows and point leaves and deleted nodes at themselves.
+        offsets = np.repeat(model.node_starts, [len(tree) for tree in model.trees])
+        rows = np.arange(len(offsets), dtype=np.int32)
+        internal = (model.left != -1) & (model.split_indices != 4294967295)
+        self.left = np.where(internal, offsets + model.left, rows).astype(np.int32)
+        self.right = np.where(internal, offsets + model.right, rows).astype(np.int32)
+        self.feature = np.where(internal, model.split_indices, 0).astype(np.int32)
+        # Leaves store their weight in the split condition field.
+        self.threshold = model.split_conditions.astype(np.float64)
+        self.default_left = np.where(internal, model.default_left != 0, True)
+        self.roots = model.node_starts.astype(np.int32)
+        offset = len(rows)
+
+        # Node ids increase from parent to child, so one pass gives depths.
+        depth = np.zeros(offset, dtype=np.int64)
+        for row in np.flatnonzero(internal):
+            depth[self.left[row]] = depth[self.right[row]] = depth[row] + 1
+        self.max_depth = int(depth.max(initial=0))
+
+        self.group_onehot = np.zeros((model.num_trees, self.num_groups), dtype=np.float64)
+        self.group_onehot[np.arange(model.num_trees), model.tree_info[:model.num_trees]] = 1
+
+        # Leaf i of the stacked leaf table is reached by exactly the
+        # instances with leaf_lower[i] <= x < leaf_upper[i].
+        index = model.leaf_index
+        self.index = index
+        self.leaf_value = index.leaf_weight
+        self.leaf_starts = index.leaf_starts
+        self.leaf_lower = np.full((len(index.leaf_weight), self.num_feature), -np.inf)
+        self.leaf_upper = np.full((len(index.leaf_weight), self.num_feature), np.inf)
+        for f_id, ts in enumerate(index.thresholds):
+            cell_lower = np.array([-np.inf] + list(ts))
+            cell_upper = np.array(list(ts) + [np.inf])
+            self.leaf_lower[:, f_id] = cell_lower[index.leaf_box[:, f_id, 0]]
+            self.leaf_upper[:, f_id] = cell_upper[index.leaf_box[:, f_id, 1]]
+        # Row of the leaf table for each node id, -1 for internal nodes.
+        self.leaf_rows = np.full(offset, -1, dtype=np.int64)
+        for tree_id, nodes in enumerate(index.leaf_nodes):
+            self.leaf_rows[self.roots[tree_id] + nodes] = index.leaf_starts[tree_id] + np.arange(len(nodes))
+        # Slack that covers float rounding of a sum over one leaf per tree.
+        self.margin_tol = 1e-9 * max(1, model.num_trees) * max(
+            1.0, float(np.max(np.abs(self.leaf_value), initial=0))
+        )
+
+    def leaves(self, X) -> np.ndarray:
+        """Node ids of the leaf reached in each tree, shape (n, num_trees)."""
+        X = np.atleast_2d(np.array(X, dtype=np.float64))
+        rows = np.arange(X.shape[0])[:, None]
+        nodes = np.repeat(self.roots[None, :], X.shape[0], axis=0)
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[nodes]]
+            go_left = np.where(
+                np.isnan(x), self.default_left[nodes], x < self.threshold[nodes]
+            )
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def margins(self, X) -> np.ndarray:
+        """
+        Sum of leaf weights per output group.
+
+        X is a single instance of length num_feature or an (n, num_feature)
+        matrix; the result has shape (num_groups,) or (n, num_groups).
+        Missing values (None or NaN) follow the default branch.
+        """
+        single = np.ndim(X) == 1
+        ws = self.threshold[self.leaves(X)] @ self.group_onehot
+        return ws[0] if single else ws
+
+    def leaf_box(self, x):
+        """
+        Bounds (lower, upper) of the box of instances that reach the same
+        leaf as x in every tree, and so have the same margins as x.
+        """
+        rows = self.leaf_rows[self.leaves(x)[0]]
+        return self.leaf_lower[rows].max(axis=0), self.leaf_upper[rows].min(axis=0)
+
+    def margin_bounds(self, lower, upper):
+        """
+        Lower and upper bounds on each group's margin over the box
+        lower <= x < upper, where lower and upper have one entry per feature
+        and unbounded features are -inf and inf.
+
+        Each tree contributes the extreme weights among the leaves whose box
+        meets the region, see LeafIndex.margin_bounds.
+        """
+        lo, hi = self.index.margin_bounds(self.index.bounds_box(lower, upper))
+        return lo[0], hi[0]
+
+    def predict(self, X) -> np.ndarray:
+        """Predicted class of each instance, following EntailmentChecker.predict."""
+        single = np.ndim(X) == 1
+        ws = np.atleast_2d(self.margins(X))
+        objective = self.model.objective
+        if objective == "binary:logistic":
+            c = (ws[:, 0] >= 0).astype(np.int64)
+        elif objective == "multi:softprob" or objective == "multi:softmax":
+            c = np.argmax(ws, axis=1)
+        else:
+            raise NotImplementedError(f"objective {objective} not implemented")
+        return int(c[0]) if single else c
@@ -125,6 +125,81 @@ class Region:
         return region
 
 
+class IndexRegion:
+    """
+    Region as positions into the domains of a FeatureSpaceInfo: feature
+    fs_info.features[k] is bounded by domain[lo[k]] <= x < domain[hi[k]].
+    A free feature has lo = -1 and hi = len(domain), standing for -inf
+    and inf, so containment is a plain comparison of the index arrays.
+
+    Immutable and hashable. Float bounds are only built when asked for.
+    """
+    __slots__ = ("fs_info", "lo", "hi", "_bounds", "_hash")
+
+    def __init__(self, fs_info, lo, hi):
+        self.fs_info = fs_info
+        self.lo = np.asarray(lo, dtype=np.int32)
+        self.hi = np.asarray(hi, dtype=np.int32)
+        self._bounds = None
+        self._hash = None
+
+    @classmethod
+    def from_region(cls, fs_info, r: Region):
+        lo, hi = fs_info.free_lo.copy(), fs_info.free_hi.copy()
+        for f_id, (lower, upper) in r.bounds.items():
+            k = fs_info.feature_pos[f_id]
+            index = fs_info.domain_index[f_id]
+            lo[k], hi[k] = index[lower], index[upper]
+        return cls(fs_info, lo, hi)
+
+    def index_bounds(self):
+        """{feature_id: (lower index, upper index)} of the bounded features."""
+        bounded = (self.lo >= 0) | (self.hi < self.fs_info.free_hi)
+        return {
+            self.fs_info.features[k]: (int(self.lo[k]), int(self.hi[k]))
+            for k in np.flatnonzero(bounded)
+        }
+
+    @property
+    def bounds(self):
+        if self._bounds is None:
+            self._bounds = {
+                f_id: (self.fs_info.domains[f_id][i], self.fs_info.domains[f_id][j])
+                for f_id, (i, j) in self.index_bounds().items()
+            }
+        return self._bounds
+
+    def to_region(self) -> Region:
+        return Region(dict(self.bounds))
+
+    def __repr__(self):
+        return repr(self.to_region())
+
+    def __eq__(self, r):
+        return np.array_equal(self.lo, r.lo) and np.array_equal(self.hi, r.hi)
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash((self.lo.tobytes(), self.hi.tobytes()))
+        return self._hash
+
+    def contains(self, r):
+        """True iff this region contains r"""
+        return bool(np.all(self.lo <= r.lo) and np.all(self.hi >= r.hi))
+
+    def contained_in(self, r):
+        """True iff this region is contained within r"""
+        return r.contains(self)
+
+    def blocked_up_by(self, r):
+        """True iff this region contains the blocked region r"""
+        return self.contains(r)
+
+    def blocked_down_by(self, r):
+        """True iff this region lies within the blocked region r"""
+        return r.contains(self)
+
+
 class LimitVariables:
     def __init__(self, feature_id, vals):
         """Supports real numbers. Implement categorical features sometime later."""
@@ -177,6 +252,16 @@ class FeatureSpaceInfo:
                 self.domains[i][0] -= 1
             if d[-1] == d[-2]:
                 self.domains[i][-1] += 1
+
+        # Position of every domain value, replacing list.index scans
+        self.domain_index = {
+            i: {v: j for j, v in enumerate(d)} for i, d in self.domains.items()
+        }
+        # Feature order and free bounds of IndexRegion arrays
+        self.features = list(self.domains.keys())
+        self.feature_pos = {f_id: k for k, f_id in enumerate(self.features)}
+        self.free_lo = np.full(len(self.features), -1, dtype=np.int32)
+        self.free_hi = np.array([len(self.domains[i]) for i in self.features], dtype=np.int32)
         
     def keys(self):
         return self.thresholds.keys()
@@ -190,6 +275,9 @@ class FeatureSpaceInfo:
     def get_dmax(self, i):
         return self.domains[i][-1]
 
+    def index_region(self, r: Region) -> IndexRegion:
+        return IndexRegion.from_region(self, r)
+
     def n_thresholds(self):
         return sum([len(d) for d in self.domains.values()])
 
@@ -206,5 +294,6 @@ class FeatureSpaceInfo:
                 continue
             d = self.domains[i]
             f_interval = r.bounds[i]
-            n *= (d.index(f_interval[0])+1) * (len(d)-d.index(f_interval[1])+1)
+            index = self.domain_index[i]
+            n *= (index[f_interval[0]]+1) * (len(d)-index[f_interval[1]]+1)
         return n 
\ No newline at end of file
@@ -0,0 +1,173 @@
+import logging
+from decimal import Decimal
+from math import fsum, isfinite
+
+from .model import Model
+
+NO_PARENT = 2147483647
+
+
+def simplify_model(model: Model, limits=None):
+    """
+    Simplify the trees of model in place, keeping every prediction on the
+    box of domain limits {f_id: (lower, upper)} (both ends inclusive).
+
+    Branches no point of the limits can reach are pruned, splits decided by
+    an ancestor on the same feature are collapsed, subtrees whose leaves
+    all hold one weight become that leaf, and stumps of the same group,
+    feature and missing value direction are merged into one step function
+    where the float sums of their weights are exact. Returns the node, threshold and tree counts before and after.
+    """
+    limits = limits or {}
+    stats = {
+        "nodes": [_count_nodes(model), 0],
+        "thresholds": [_count_thresholds(model), 0],
+        "trees": [model.num_trees, 0],
+    }
+
+    simplified = []
+    for tree in model.trees:
+        box = {}
+        for f_id, (lower, upper) in limits.items():
+            lower = lower if isfinite(lower) else float("-inf")
+            upper = upper if isfinite(upper) else float("inf")
+            box[f_id] = (lower, upper, True)
+        simplified.append(_simplify(tree, 0, box))
+
+    groups = model.tree_info[:model.num_trees]
+    subtrees, tree_info = _merge_stumps(simplified, groups)
+
+    model.set_trees([_build_tree(i, sub) for i, sub in enumerate(subtrees)], tree_info)
+
+    stats["nodes"][1] = _count_nodes(model)
+    stats["thresholds"][1] = _count_thresholds(model)
+    stats["trees"][1] = model.num_trees
+    logging.info(
+        "simplified model: nodes %d -> %d, thresholds %d -> %d, trees %d -> %d" % (
+            *stats["nodes"], *stats["thresholds"], *stats["trees"]
+        )
+    )
+    return stats
+
+
+def _count_nodes(model):
+    return sum(
+        1 for tree in model.trees for node_id in range(len(tree))
+        if not tree.is_deleted(node_id)
+    )
+
+
+def _count_thresholds(model):
+    return sum(len(ts) for ts in model.thresholds.values())
+
+
+def _simplify(tree, node_id, box):
+    """
+    Subtree below node_id restricted to box {f_id: (lower, upper, closed)},
+    as ("leaf", weight, stats) or ("split", f_id, value, default_left,
+    stats, left, right) where stats are the original node statistics.
+    """
+    stats = [tree.loss_change(node_id), tree.sum_hessian(node_id), tree.base_weight(node_id)]
+    if tree.is_leaf(node_id):
+        return ("leaf", tree.split_condition(node_id), stats)
+    f_id = tree.split_index(node_id)
+    val = tree.split_condition(node_id)
+    lower, upper, closed = box.get(f_id, (float("-inf"), float("inf"), False))
+    go_left = lower < val
+    go_right = upper > val or (closed and upper == val)
+    if go_left and not go_right:
+        return _simplify(tree, tree.left_child(node_id), box)
+    if go_right and not go_left:
+        return _simplify(tree, tree.right_child(node_id), box)
+
+    left = _simplify(tree, tree.left_child(node_id), {**box, f_id: (lower, val, False)})
+    right = _simplify(tree, tree.right_child(node_id), {**box, f_id: (val, upper, closed)})
+    if left[0] == "leaf" and right[0] == "leaf" and left[1] == right[1]:
+        return ("leaf", left[1], stats)
+    default_left = tree.default_left(node_id)
+    return ("split", f_id, val, default_left, stats, left, right)
+
+
+def _merge_stumps(subtrees, groups):
+    """
+    Replace the stumps sharing a group, feature and default direction by a
+    single balanced tree over their thresholds. Returns the subtrees and
+    their groups.
+    """
+    merged, merged_groups = [], []
+    stumps = {}
+    for sub, grp in zip(subtrees, groups):
+        if sub[0] == "split" and sub[5][0] == "leaf" and sub[6][0] == "leaf":
+            stumps.setdefault((grp, sub[1], sub[3]), []).append(sub)
+        else:
+            merged.append(sub)
+            merged_groups.append(grp)
+    for (grp, f_id, default_left), subs in stumps.items():
+        step = _step_tree(f_id, default_left, subs) if len(subs) > 1 else None
+        if step is None:
+            merged += subs
+            merged_groups += [grp] * len(subs)
+        else:
+            merged.append(step)
+            merged_groups.append(grp)
+    return merged, merged_groups
+
+
+def _step_tree(f_id, default_left, stumps):
+    """
+    Balanced tree of the sum of stumps on one feature, or None if a sum is
+    not exact. The entailers read weights as the decimals of their float
+    reprs, so a rounded sum would move tied margins.
+    """
+    values = sorted(set(sub[2] for sub in stumps))
+    # weights[i] is the sum on the cell below values[i], the last cell above all
+    weights = []
+    for cell in range(len(values) + 1):
+        cell_ws = [
+            sub[5][1] if cell < len(values) and values[cell] <= sub[2] else sub[6][1]
+            for sub in stumps
+        ]
+        weight = fsum(cell_ws)
+        if Decimal(repr(weight)) != sum(Decimal(repr(w)) for w in cell_ws):
+            return None
+        weights.append(weight)
+
+    def build(lo, hi):
+        # cells lo..hi, split on the thresholds between them
+        if lo == hi:
+            return ("leaf", weights[lo], [0.0, 0.0, weights[lo]])
+        mid = (lo + hi) // 2
+        return (
+            "split", f_id, values[mid], default_left, [0.0, 0.0, 0.0],
+            build(lo, mid), build(mid + 1, hi)
+        )
+    return build(0, len(values))
+
+
+def _build_tree(tree_id, sub):
+    """Tree in the XGBoost JSON schema from a nested subtree, numbered depth first."""
+    fields = (
+        'left_children', 'right_children', 'parents', 'split_indices',
+        'split_conditions', 'default_left', 'loss_changes', 'sum_hessian',
+        'base_weights'
+    )
+    tree = {name: [] for name in fields}
+    tree['id'] = tree_id
+
+    def emit(sub, parent):
+        node_id = len(tree['parents'])
+        for name in fields:
+            tree[name].append(None)
+        if sub[0] == "leaf":
+            row = [-1, -1, parent, 0, sub[1], 0] + list(sub[2])
+        else:
+            _, f_id, val, default_left, stats, left, right = sub
+            left_id = emit(left, node_id)
+            right_id = emit(right, node_id)
+            row = [left_id, right_id, parent, f_id, val, int(default_left)] + list(stats)
+        for name, value in zip(fields, row):
+            tree[name][node_id] = value
+        return node_id
+
+    emit(sub, NO_PARENT)
+    return tree
@@ -1,34 +1,53 @@
 from .entailment.z3_entailer import EntailmentChecker
-from .regions import Region
+from .regions import Region, FeatureSpaceInfo
 
 
 class LatticeTraverser:
     def __init__(
             self, 
             entailer: EntailmentChecker, 
-            domains: dict[int: list[float]], 
+            fs_info: FeatureSpaceInfo, 
             method="left"
         ):
         self.entailer = entailer 
-        self.domains = domains
+        self.domains = fs_info.domains
+        self.domain_index = fs_info.domain_index
         self.method = method
         self.search_bounds = {
-            f_id: (-1, len(domains[f_id])) 
+            f_id: (-1, len(self.domains[f_id])) 
             for f_id in self.domains.keys()
         }
     
     def must_contain(self, r: Region):
         self.search_bounds = {
-            f_id: (self.domains[f_id].index(b[0]), self.domains[f_id].index(b[1]))
+            f_id: (self.domain_index[f_id][b[0]], self.domain_index[f_id][b[1]])
             for (f_id, b) in r.bounds.items()
         }
 
-    def grow(self, r: Region, c: str):
+    def grow(self, r: Region, c: str, core=None):
+        """
+        Grow the entailing region r as far as it still entails c. core is
+        the entailer's core of the query that showed r entails c, if any.
+        """
+        if core is not None:
+            self.relax_to_core(r, core)
         self._bsearch_step(r, c, "grow")
 
     def shrink(self, r: Region, c: str):
         self._bsearch_step(r, c, "shrink")
     
+    def relax_to_core(self, r: Region, core: set):
+        """
+        Move every bound of an entailing region that the entailment proof
+        did not use, i.e. that is not in core, to the edge of its domain.
+        """
+        for f_id, b in r.bounds.items():
+            d = self.domains[f_id]
+            r.bounds[f_id] = (
+                b[0] if (f_id, 0) in core else d[0],
+                b[1] if (f_id, 1) in core else d[-1]
+            )
+
     def eliminate_vars(self, r: Region):
         to_remove = set()
         c = self.entailer.predict([
@@ -50,8 +69,8 @@ class LatticeTraverser:
         for (f_id, side) in ((i, j) for i in self.domains.keys() for j in (0, 1)):
             d = self.domains[f_id]
             bound = r.bounds[f_id]
-            i = d.index(bound[0])
-            j = d.index(bound[1])
+            i = self.domain_index[f_id][bound[0]]
+            j = self.domain_index[f_id][bound[1]]
 
             if side == 0 and mode == "grow":
                 d = d[:i+1]
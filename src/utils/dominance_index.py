@@ -0,0 +1,83 @@
+import numpy as np
+
+
+class DominanceIndex:
+    """
+    Blocked regions over domain positions, answering whether any of them
+    lies inside a query region (mode "up") or around it (mode "down").
+
+    Each feature has one bitset row per domain position for each side.
+    In "up" mode, lower row v holds the regions whose lower position is at
+    least v and upper row v those whose upper position is at most v, so a
+    query is the AND of one lower and one upper row per feature. "down"
+    mode flips both comparisons. A position of -1 marks a feature the
+    blocked region does not bound, which matches any query.
+
+    Rows are preallocated and grown by doubling, and queries run into
+    fixed buffers, so neither adding nor querying allocates per call.
+    """
+    def __init__(self, sizes, mode="up", capacity=64):
+        if mode not in ("up", "down"):
+            raise ValueError(f"{mode} not a valid dominance mode")
+        self.mode = mode
+        self.sizes = np.asarray(sizes, dtype=np.int64)
+        # positions 0..size of every feature, stacked
+        self.offsets = np.concatenate([[0], np.cumsum(self.sizes + 1)[:-1]]).astype(np.int64)
+        self.row_feature = np.repeat(np.arange(len(self.sizes)), self.sizes + 1)
+        self.row_pos = np.arange(int(np.sum(self.sizes + 1))) - self.offsets[self.row_feature]
+        self.size = 0
+        # row numbers of a query, filled in place
+        self._rows_lo = np.zeros(len(self.sizes), dtype=np.int64)
+        self._rows_hi = np.zeros(len(self.sizes), dtype=np.int64)
+        self._alloc(max(1, (capacity + 63) // 64))
+
+    def __len__(self):
+        return self.size
+
+    def _alloc(self, n_words):
+        n_rows = len(self.row_pos)
+        lower = np.zeros((n_rows, n_words), dtype=np.uint64)
+        upper = np.zeros((n_rows, n_words), dtype=np.uint64)
+        if self.size > 0:
+            old = self.lower.shape[1]
+            lower[:, :old] = self.lower
+            upper[:, :old] = self.upper
+        self.lower, self.upper = lower, upper
+        self.n_words = n_words
+        self._rows_lower = np.zeros((len(self.sizes), n_words), dtype=np.uint64)
+        self._rows_upper = np.zeros((len(self.sizes), n_words), dtype=np.uint64)
+        self._hits = np.zeros(n_words, dtype=np.uint64)
+
+    def add(self, lo, hi):
+        """Add a blocked region with lower and upper positions per feature."""
+        if self.size == self.n_words * 64:
+            self._alloc(self.n_words * 2)
+        word, bit = divmod(self.size, 64)
+        lo = np.asarray(lo, dtype=np.int64)[self.row_feature]
+        hi = np.asarray(hi, dtype=np.int64)[self.row_feature]
+        if self.mode == "up":
+            set_lower = (self.row_pos <= lo) | (lo < 0)
+            set_upper = (self.row_pos >= hi) | (hi < 0)
+        else:
+            set_lower = (self.row_pos >= lo) | (lo < 0)
+            set_upper = (self.row_pos <= hi) | (hi < 0)
+        mask = np.uint64(1 << bit)
+        self.lower[set_lower, word] |= mask
+        self.upper[set_upper, word] |= mask
+        self.size += 1
+
+    def query(self, lo, hi):
+        """
+        True iff a blocked region dominates the region with lower and upper
+        positions lo and hi, which must bound every feature.
+        """
+        if self.size == 0:
+            return False
+        n_words = (self.size + 63) // 64
+        np.add(self.offsets, lo, out=self._rows_lo)
+        np.add(self.offsets, hi, out=self._rows_hi)
+        np.take(self.lower, self._rows_lo, axis=0, out=self._rows_lower, mode="clip")
+        np.take(self.upper, self._rows_hi, axis=0, out=self._rows_upper, mode="clip")
+        np.bitwise_and(self._rows_lower, self._rows_upper, out=self._rows_lower)
+        np.bitwise_and.reduce(self._rows_lower[:, :n_words], axis=0, out=self._hits[:n_words])
+        return bool(self._hits[:n_words].any())
@@ -0,0 +1,26 @@
+from decimal import Decimal
+from math import isfinite
+
+
+def fixed_point_scale(values, max_digits=30):
+    """
+    Smallest k such that every value times 10^k is an integer, or None if
+    that needs more than max_digits digits or a value is not finite.
+
+    Values are read as the decimals they print as, which is also how Z3
+    reads a float constant, so comparisons between sums of the scaled
+    integers decide exactly as comparisons between sums of the values.
+    """
+    k = 0
+    for v in values:
+        if not isfinite(v):
+            return None
+        k = max(k, -Decimal(repr(v)).as_tuple().exponent)
+        if k > max_digits:
+            return None
+    return k
+
+
+def to_fixed_point(v, k):
+    """The integer v * 10^k for a value v with at most k decimal places."""
+    return int(Decimal(repr(v)).scaleb(k))
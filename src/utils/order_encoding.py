@@ -0,0 +1,89 @@
+class OrderEncoding:
+    """
+    Order (ladder) encoding of the interval bounds of the SAT generators.
+
+    For a feature i with domain d of size m, L_i_j means the lower bound
+    index is at least j and U_i_k means the upper bound index is at most
+    k. The ladders L_i_(j+1) -> L_i_j and U_i_k -> U_i_(k+1) make every
+    assignment a single cut, so the one-hot bound variables l_ij and u_ik
+    of the direct encoding are channelled in with three clauses each and
+    need no cardinality encoding. l < u is one binary clause per index,
+    and must_contain, block_up and block_down need one order literal per
+    bound, so the whole encoding is linear in m apart from the I_ijk
+    definitions the soft clauses need.
+    """
+    def __init__(self, vpool):
+        self.vpool = vpool
+
+    def L(self, i, j):
+        return self.vpool.id(f"L_{i}_{j}")
+
+    def U(self, i, k):
+        return self.vpool.id(f"U_{i}_{k}")
+
+    def bounds(self, i, m, l, u):
+        """
+        Clauses tying l(i, j) and u(i, k) to the ladders of a feature with
+        m domain values, with l < u.
+        """
+        L = lambda j: self.L(i, j)
+        U = lambda k: self.U(i, k)
+        cnf = [[L(0)], [U(m-1)]]
+        cnf.append([-L(m-1)])  # Lower bound can't be highest threshold
+        cnf.append([-U(0)])  # Upper bound can't be lowest threshold
+        for j in range(m-1):
+            cnf.append([-L(j+1), L(j)])  # lower >= j+1 -> lower >= j
+            cnf.append([-U(j), U(j+1)])  # upper <= j -> upper <= j+1
+        for j in range(m):
+            # l_ij <-> L_ij ^ ~L_i(j+1)
+            cnf.append([-l(i,j), L(j)])
+            if j < m-1:
+                cnf.append([-l(i,j), -L(j+1)])
+                cnf.append([-L(j), L(j+1), l(i,j)])
+            else:
+                cnf.append([-L(j), l(i,j)])
+            # u_ik <-> U_ik ^ ~U_i(k-1)
+            cnf.append([-u(i,j), U(j)])
+            if j > 0:
+                cnf.append([-u(i,j), -U(j-1)])
+                cnf.append([-U(j), U(j-1), u(i,j)])
+            else:
+                cnf.append([-U(j), u(i,j)])
+        for j in range(1, m-1):
+            cnf.append([-L(j), -U(j)])  # lower >= j -> upper > j
+        return cnf
+
+    @staticmethod
+    def interval(l_ij, u_ik, I_ijk):
+        """Clauses of I_ijk <-> l_ij ^ u_ik."""
+        return [[-l_ij, -u_ik, I_ijk], [-I_ijk, l_ij], [-I_ijk, u_ik]]
+
+    def must_contain(self, d_idx, domains):
+        """Unit clauses keeping every bound of the generated region outside d_idx."""
+        cnf = []
+        for i, (l_idx, u_idx) in d_idx.items():
+            if l_idx+1 < len(domains[i]):
+                cnf.append([-self.L(i, l_idx+1)])  # lower <= l_idx
+            if u_idx > 0:
+                cnf.append([-self.U(i, u_idx-1)])  # upper >= u_idx
+        return cnf
+
+    def block_up(self, d_idx, domains):
+        """Clause blocking every region containing the region d_idx."""
+        clause = []
+        for i, (l_idx, u_idx) in d_idx.items():
+            if l_idx < len(domains[i])-1:
+                clause.append(self.L(i, l_idx+1))  # lower > l_idx
+            if u_idx > 0:
+                clause.append(self.U(i, u_idx-1))  # upper < u_idx
+        return clause
+
+    def block_down(self, d_idx, domains):
+        """Clause blocking every region within the region d_idx."""
+        clause = []
+        for i, (l_idx, u_idx) in d_idx.items():
+            if l_idx > 0:
+                clause.append(-self.L(i, l_idx))  # lower < l_idx
+            if u_idx < len(domains[i])-1:
+                clause.append(-self.U(i, u_idx))  # upper > u_idx
+        return clause
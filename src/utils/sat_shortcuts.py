@@ -1,7 +1,23 @@
+from pysat.card import CardEnc, EncType
+
+# Most clauses Or.to_cnf produces by distribution when given an IDPool;
+# larger disjunctions name their disjuncts with auxiliary variables instead
+TSEITIN_LIMIT = 64
+
 class Formula:
     def __init__(self):
         pass 
 
+    def to_cnf(self, vpool=None):
+        """
+        Clauses of the formula. Without vpool the clauses are equivalent to
+        the formula over its own variables. With vpool, disjunctions that
+        would distribute into more than TSEITIN_LIMIT clauses take fresh
+        variables from it (Plaisted-Greenbaum), so the clauses are only
+        equisatisfiable and must not be negated again.
+        """
+        raise NotImplementedError
+
 class Not(Formula):
     def __init__(self, formula):
         if formula == []:
@@ -16,15 +32,16 @@ class Not(Formula):
         else:
             return f"~({str(self.formula)})"
     
-    def to_cnf(self):
+    def to_cnf(self, vpool=None):
         if type(self.formula) == int:
             return [[-self.formula]]
         elif type(self.formula) == list:
             return And([-x for x in self.formula]).to_cnf()
         cnf = []
+        # the negated clauses must be exact, so no auxiliary variables here
         for f in self.formula.to_cnf():
             cnf.append(And([-x for x in f]))
-        return Or(cnf).to_cnf()
+        return Or(cnf).to_cnf(vpool)
 
 class Or(Formula):
     def __init__(self, formulas):
@@ -39,23 +56,42 @@ class Or(Formula):
         s = s[:-3] + ")"
         return s
 
-    def to_cnf(self):
-        cnf = []
-        f = self.formulas[0]
-        if type(f) == int:
-            cnf.append([f])
-        elif type(f) == list:
-            cnf.append(f)
-        else:
-            cnf = f.to_cnf()
-        for f in self.formulas[1:]:
+    def to_cnf(self, vpool=None):
+        parts = []
+        for f in self.formulas:
             if type(f) == int:
-                cnf = [A + [f] for A in cnf]
+                parts.append([[f]])
             elif type(f) == list:
-                cnf = [A + f for A in cnf]
+                parts.append([f])
+            else:
+                parts.append(f.to_cnf(vpool))
+        if vpool is None or not self._exceeds(parts, TSEITIN_LIMIT):
+            cnf = parts[0]
+            for part in parts[1:]:
+                cnf = [A + B for A in part for B in cnf]
+            return cnf
+        # Each disjunct of several clauses is replaced by a fresh t with
+        # t -> disjunct, which suffices as the disjunction is asserted
+        clause = []
+        definitions = []
+        for part in parts:
+            if len(part) == 1:
+                clause += part[0]
             else:
-                cnf = [A + B for A in f.to_cnf() for B in cnf]
-        return cnf
+                t = vpool.id()
+                clause.append(t)
+                definitions += [[-t] + c for c in part]
+        return [clause] + definitions
+
+    @staticmethod
+    def _exceeds(parts, limit):
+        """Whether distributing parts would give more than limit clauses."""
+        n = 1
+        for part in parts:
+            n *= len(part)
+            if n > limit:
+                return True
+        return False
 
 class And(Formula):
     def __init__(self, formulas):
@@ -70,7 +106,7 @@ class And(Formula):
         s = s[:-3] + ")"
         return s
     
-    def to_cnf(self):
+    def to_cnf(self, vpool=None):
         # TODO: Variable order consistency with Or
         enc = []
         for f in self.formulas:
@@ -79,7 +115,7 @@ class And(Formula):
             elif type(f) == list:
                 enc.append(f)
             else:
-                enc += f.to_cnf()
+                enc += f.to_cnf(vpool)
         return enc
 
 class Implies(Formula):
@@ -101,8 +137,8 @@ class Implies(Formula):
         else:
             return p
     
-    def to_cnf(self):
-        return Or([Not(self.p), self.q]).to_cnf()
+    def to_cnf(self, vpool=None):
+        return Or([Not(self.p), self.q]).to_cnf(vpool)
 
 class Iff(Formula):
     def __init__(self, p, q):
@@ -123,8 +159,8 @@ class Iff(Formula):
         else:
             return p
     
-    def to_cnf(self):
-        return And([Implies(self.p, self.q), Implies(self.q, self.p)]).to_cnf()
+    def to_cnf(self, vpool=None):
+        return And([Implies(self.p, self.q), Implies(self.q, self.p)]).to_cnf(vpool)
 
 class EqualsOne(Formula):
     def __init__(self, literals):
@@ -138,24 +174,8 @@ class EqualsOne(Formula):
             s += f"{x} + "
         return s[:-2] + "= one"
     
-    def to_cnf(self):
-        l = self.literals
-        to_disjunct = []
-        for x in self.literals:
-            c = [-a for a in self.literals]
-            c[c.index(-x)] = x
-            to_disjunct.append(And(c))
-        cnf = And([Or(self.literals), Or(to_disjunct)]).to_cnf()
-        cleaned_cnf = []
-        for clause in cnf:
-            seen = set()
-            skip = False
-            for x in clause:
-                if -x in seen:
-                    skip = True
-                    break
-                else:
-                    seen.add(x)
-            if not skip:
-                cleaned_cnf.append(list(set(clause)))
-        return cleaned_cnf
\ No newline at end of file
+    def to_cnf(self, vpool=None):
+        """Pairwise encoding, or a sequential counter over vpool."""
+        if vpool is None:
+            return CardEnc.equals(self.literals, encoding=EncType.pairwise).clauses
+        return CardEnc.equals(self.literals, vpool=vpool, encoding=EncType.seqcounter).clauses
@@ -0,0 +1,123 @@
+from struct import Struct
+
+import numpy as np
+
+# Fixed-size value markers, with their big-endian struct and NumPy types
+_NUMERIC = {
+    ord("i"): (Struct(">b"), np.dtype(">i1")),
+    ord("U"): (Struct(">B"), np.dtype(">u1")),
+    ord("I"): (Struct(">h"), np.dtype(">i2")),
+    ord("l"): (Struct(">i"), np.dtype(">i4")),
+    ord("L"): (Struct(">q"), np.dtype(">i8")),
+    ord("d"): (Struct(">f"), np.dtype(">f4")),
+    ord("D"): (Struct(">d"), np.dtype(">f8")),
+}
+_NOOP, _STRING, _HIGH_PRECISION, _CHAR = ord("N"), ord("S"), ord("H"), ord("C")
+_TRUE, _FALSE, _NULL = ord("T"), ord("F"), ord("Z")
+_ARRAY, _ARRAY_END, _OBJECT, _OBJECT_END = ord("["), ord("]"), ord("{"), ord("}")
+_TYPE, _COUNT = ord("$"), ord("#")
+
+
+def loads(data):
+    """
+    Decode a UBJSON document such as XGBoost's .ubj model format.
+
+    Strongly typed numeric arrays are read straight from the buffer into
+    native-endian NumPy arrays. Everything else decodes as in json.loads.
+    """
+    value, _ = _Decoder(bytes(data)).value(0)
+    return value
+
+
+def load(path):
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+class _Decoder:
+    def __init__(self, buf: bytes):
+        self.buf = buf
+
+    def value(self, pos, marker=None):
+        buf = self.buf
+        if marker is None:
+            marker, pos = self._marker(pos)
+        numeric = _NUMERIC.get(marker)
+        if numeric is not None:
+            fmt = numeric[0]
+            return fmt.unpack_from(buf, pos)[0], pos + fmt.size
+        if marker == _STRING or marker == _HIGH_PRECISION:
+            n, pos = self._length(pos)
+            s = buf[pos:pos+n].decode("utf-8")
+            return (s if marker == _STRING else float(s)), pos + n
+        if marker == _OBJECT:
+            return self._object(pos)
+        if marker == _ARRAY:
+            return self._array(pos)
+        if marker == _CHAR:
+            return buf[pos:pos+1].decode("utf-8"), pos + 1
+        if marker == _TRUE:
+            return True, pos
+        if marker == _FALSE:
+            return False, pos
+        if marker == _NULL:
+            return None, pos
+        raise ValueError(f"invalid UBJSON marker {chr(marker)!r} at {pos - 1}")
+
+    def _marker(self, pos):
+        buf = self.buf
+        if pos >= len(buf):
+            raise ValueError("truncated UBJSON document")
+        while buf[pos] == _NOOP:
+            pos += 1
+        return buf[pos], pos + 1
+
+    def _length(self, pos):
+        n, pos = self.value(pos)
+        if not isinstance(n, int) or n < 0:
+            raise ValueError(f"invalid UBJSON length {n!r}")
+        return n, pos
+
+    def _container(self, pos):
+        """Element marker and count of an optimised container, if given."""
+        buf = self.buf
+        elem, count = None, None
+        if buf[pos] == _TYPE:
+            elem, pos = buf[pos+1], pos + 2
+        if buf[pos] == _COUNT:
+            count, pos = self._length(pos + 1)
+        elif elem is not None:
+            raise ValueError("UBJSON container type without a count")
+        return elem, count, pos
+
+    def _array(self, pos):
+        elem, count, pos = self._container(pos)
+        if elem in _NUMERIC:
+            dtype = _NUMERIC[elem][1]
+            values = np.frombuffer(self.buf, dtype, count, pos)
+            return values.astype(dtype.newbyteorder("=")), pos + count * dtype.itemsize
+        values = []
+        if count is not None:
+            for _ in range(count):
+                v, pos = self.value(pos, elem)
+                values.append(v)
+            return values, pos
+        while True:
+            marker, pos = self._marker(pos)
+            if marker == _ARRAY_END:
+                return values, pos
+            v, pos = self.value(pos, marker)
+            values.append(v)
+
+    def _object(self, pos):
+        buf = self.buf
+        elem, count, pos = self._container(pos)
+        obj = {}
+        n_read = 0
+        while count is None or n_read < count:
+            if count is None and buf[pos] == _OBJECT_END:
+                return obj, pos + 1
+            n, pos = self._length(pos)
+            obj[buf[pos:pos+n].decode("utf-8")], pos = self.value(pos + n, elem)
+            n_read += 1
+        return obj, pos
@@ -0,0 +1,21 @@
+from benchmark.benchmark import get_lims
+from src.model import Model
+from src.regions import Region
+
+def load(name):
+    """Model and domain limits {f_id: (lower, upper)} of models/<name>."""
+    return Model.load(f"models/{name}.json"), get_lims(f"models/{name}.lims")
+
+def random_region(fs_info, rng, p_free=0):
+    """
+    Region between two random values of every domain of fs_info, leaving
+    each feature unbounded with probability p_free.
+    """
+    bounds = {}
+    for f_id, dom in fs_info.domains.items():
+        if p_free and rng.random() < p_free:
+            continue
+        i = rng.randrange(len(dom) - 1)
+        j = rng.randrange(i + 1, len(dom))
+        bounds[f_id] = (dom[i], dom[j])
+    return Region(bounds)
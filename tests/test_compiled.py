@@ -0,0 +1,55 @@
+import shutil
+import random
+
+from benchmark.benchmark import get_lims
+from src.compiled import compile_model, artifact_path
+from src.explainer import ExplanationProgram
+
+def test_artifact_reused(tmp_path):
+    path = str(tmp_path / "iris.json")
+    shutil.copy("models/iris.json", path)
+    lims = get_lims("models/iris.lims")
+    compiled = compile_model(path, lims, cache=True)
+    assert "maxsat" in compiled.generators
+    mtime = (tmp_path / "iris.compiled").stat().st_mtime_ns
+    assert artifact_path(path) == str(tmp_path / "iris.compiled")
+
+    cached = compile_model(path, lims, cache=True)
+    assert cached.key == compiled.key
+    assert (tmp_path / "iris.compiled").stat().st_mtime_ns == mtime
+    assert cached.fs_info.domains == compiled.fs_info.domains
+
+    other = compile_model(path, {f_id: (lo - 1, hi + 1) for f_id, (lo, hi) in lims.items()}, cache=True)
+    assert other.key != compiled.key
+
+def test_no_cache_by_default(tmp_path):
+    path = str(tmp_path / "iris.json")
+    shutil.copy("models/iris.json", path)
+    compiled = compile_model(path, get_lims("models/iris.lims"))
+    assert not (tmp_path / "iris.compiled").exists()
+    assert compiled.smt2 is None and not compiled.generators
+
+def test_compiled_explanations(tmp_path):
+    path = str(tmp_path / "iris.json")
+    shutil.copy("models/iris.json", path)
+    lims = get_lims("models/iris.lims")
+    compile_model(path, lims, cache=True)
+    compiled = compile_model(path, lims, cache=True)
+    model = compiled.model
+    cached = ExplanationProgram(model, limits=lims, seed_gen="maxsat", compiled=compiled)
+    fresh = ExplanationProgram(model, limits=lims, seed_gen="maxsat")
+    rng = random.Random(0)
+    for _ in range(3):
+        x = [rng.uniform(*lims[f_id]) for f_id in sorted(lims)]
+        assert cached.explain(x) == fresh.explain(x)
+
+def test_entailer_options():
+    path = "models/iris.json"
+    lims = get_lims("models/iris.lims")
+    compiled = compile_model(path, lims)
+    program = ExplanationProgram(
+        compiled.model, limits=lims, seed_gen="maxsat", compiled=compiled,
+        bound_encoding="order", entailer_options={"encoding": "region", "arithmetic": "int"}
+    )
+    assert program.entailer.encoding == "region" and program.entailer.scale is not None
+    assert program.generator.encoding == "order"
@@ -0,0 +1,15 @@
+import numpy as np
+
+from src.entailment.counterexample_pool import CounterexamplePool
+
+def test_find():
+    pool = CounterexamplePool(2, 3)
+    for i in range(50):
+        pool.add([float(i), None], [0.0, 1.0, -1.0])
+    inf = np.inf
+    # every stored point predicts class 1
+    assert pool.find(np.array([10, -inf]), np.array([11, inf]), [(0, 1), (0, 2)]) == [10.0, None]
+    assert pool.find(np.array([10, -inf]), np.array([11, inf]), [(1, 0), (1, 2)]) is None
+    assert pool.find(np.array([10.5, -inf]), np.array([11, inf]), [(0, 1)]) is None
+    assert pool.find(np.array([10, 0]), np.array([11, 1]), [(0, 1)]) is None
+    assert pool.hits == 1
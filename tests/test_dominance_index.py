@@ -0,0 +1,51 @@
+import random
+
+import numpy as np
+
+from src.regions import Region, FeatureSpaceInfo
+from src.utils.dominance_index import DominanceIndex
+
+def _random_region(rng, fs_info, p_free):
+    bounds = {}
+    for f_id, dom in fs_info.domains.items():
+        if rng.random() < p_free:
+            continue
+        i = rng.randrange(len(dom) - 1)
+        j = rng.randrange(i + 1, len(dom))
+        bounds[f_id] = (dom[i], dom[j])
+    return Region(bounds)
+
+def _positions(fs_info, r):
+    lo = np.full(len(fs_info.features), -1, dtype=np.int64)
+    hi = np.full(len(fs_info.features), -1, dtype=np.int64)
+    for f_id, (l, u) in r.bounds.items():
+        k = fs_info.feature_pos[f_id]
+        lo[k], hi[k] = fs_info.domain_index[f_id][l], fs_info.domain_index[f_id][u]
+    return lo, hi
+
+def test_against_regions():
+    fs_info = FeatureSpaceInfo({0: [1.0, 2.0, 3.0], 1: [0.5, 1.5], 2: [4.0, 5.0, 6.0, 7.0]})
+    sizes = [len(fs_info.domains[f]) for f in fs_info.features]
+    rng = random.Random(0)
+    up = DominanceIndex(sizes, mode="up", capacity=8)
+    down = DominanceIndex(sizes, mode="down", capacity=8)
+    blocked = []
+    # enough regions to grow past the initial capacity a few times
+    for _ in range(300):
+        r = _random_region(rng, fs_info, 0.2)
+        blocked.append(r)
+        up.add(*_positions(fs_info, r))
+        down.add(*_positions(fs_info, r))
+    assert len(up) == len(down) == 300
+
+    for _ in range(200):
+        q = _random_region(rng, fs_info, 0.0)
+        lo, hi = _positions(fs_info, q)
+        assert up.query(lo, hi) == any(q.blocked_up_by(b) for b in blocked)
+        assert down.query(lo, hi) == any(q.blocked_down_by(b) for b in blocked)
+
+def test_empty():
+    index = DominanceIndex([3, 4])
+    assert not index.query(np.array([0, 0]), np.array([2, 3]))
+    index.add(np.array([-1, -1]), np.array([-1, -1]))
+    assert index.query(np.array([0, 0]), np.array([2, 3]))
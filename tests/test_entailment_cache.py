@@ -0,0 +1,38 @@
+import random
+
+from src.regions import Region, FeatureSpaceInfo
+from src.entailment.z3_entailer import EntailmentChecker
+from tests.helpers import load
+
+def test_iris():
+    model, _ = load("iris")
+    fs_info = FeatureSpaceInfo(model.thresholds)
+    cached = EntailmentChecker(model, prefilter=False, cache_size=16)
+    uncached = EntailmentChecker(model, prefilter=False, cache_size=0)
+    rng = random.Random(0)
+    idx = {f_id: [0, len(dom) - 1] for f_id, dom in fs_info.domains.items()}
+    for _ in range(200):
+        # random walk over the lattice so queries revisit nested regions
+        f_id = rng.choice(list(idx.keys()))
+        i, j = idx[f_id]
+        side = rng.randrange(2)
+        step = rng.choice((-1, 1))
+        if side == 0 and 0 <= i + step < j:
+            idx[f_id][0] += step
+        elif side == 1 and i < j + step < len(fs_info.domains[f_id]):
+            idx[f_id][1] += step
+        bounds = {
+            f_id: (fs_info.domains[f_id][i], fs_info.domains[f_id][j])
+            for f_id, (i, j) in idx.items()
+        }
+        r = Region(bounds)
+        out = rng.choice(cached.groups)
+        entailed = cached.entails(r, out)
+        assert entailed == uncached.entails(r, out)
+        if not entailed:
+            x = cached.cexample
+            assert cached.predict(x) != out
+            for f_id, (lower, upper) in bounds.items():
+                assert lower <= x[f_id] < upper
+    assert cached.cache.hits > 0
+    assert all(len(t) <= 16 for t in cached.cache.tables.values())
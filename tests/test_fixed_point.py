@@ -0,0 +1,26 @@
+import random
+
+from src.regions import FeatureSpaceInfo
+from src.entailment.z3_entailer import EntailmentChecker
+from src.utils.fixed_point import fixed_point_scale, to_fixed_point
+from tests.helpers import load, random_region
+
+def test_scale():
+    assert fixed_point_scale([0.5, -1.25, 3.0]) == 2
+    assert to_fixed_point(-1.25, 2) == -125
+    assert fixed_point_scale([0.1 + 0.2]) == 17
+    assert fixed_point_scale([1e-40]) is None
+    assert fixed_point_scale([float("nan")]) is None
+
+def test_int_arithmetic():
+    model, _ = load("wine")
+    fs_info = FeatureSpaceInfo(model.thresholds)
+    kwargs = dict(prefilter=False, cache_size=0, pool=False)
+    real = EntailmentChecker(model, **kwargs)
+    fixed = EntailmentChecker(model, arithmetic="int", **kwargs)
+    assert fixed.scale is not None
+    rng = random.Random(0)
+    for _ in range(50):
+        r = random_region(fs_info, rng)
+        out = rng.choice(real.groups)
+        assert real.entails(r, out) == fixed.entails(r, out)
@@ -0,0 +1,37 @@
+import random
+
+import numpy as np
+
+from src.regions import Region, FeatureSpaceInfo
+from src.predictor import EnsemblePredictor
+from tests.helpers import load, random_region
+
+def test_wine():
+    model, _ = load("wine")
+    index = model.leaf_index
+    predictor = EnsemblePredictor(model)
+    fs_info = FeatureSpaceInfo(model.thresholds)
+    assert all(b.shape[1:] == (model.num_feature, 2) for b in index.boxes)
+
+    rng = random.Random(0)
+    regions = [random_region(fs_info, rng, p_free=0.3) for _ in range(50)]
+
+    lo, hi = index.margin_bounds(index.region_boxes(regions))
+    for k, r in enumerate(regions):
+        lower = np.full(model.num_feature, -np.inf)
+        upper = np.full(model.num_feature, np.inf)
+        for f_id, (l, u) in r.bounds.items():
+            lower[f_id], upper[f_id] = l, u
+        assert np.array_equal(index.bounds_box(lower, upper), index.region_box(r))
+        lower = np.where(np.isinf(lower), -1e3, lower)
+        upper = np.where(np.isinf(upper), 1e3, upper)
+        X = np.array([[rng.uniform(l, u) for l, u in zip(lower, upper)] for _ in range(50)])
+        ws = predictor.margins(X)
+        assert np.all(ws >= lo[k] - 1e-9) and np.all(ws <= hi[k] + 1e-9)
+
+    # a single cell reaches exactly one leaf per tree
+    x = [rng.uniform(*fs_info.domains[f][:2]) if f in fs_info.keys() else 0.0
+         for f in range(model.num_feature)]
+    cell = Region({f_id: (x[f_id], x[f_id] + 1e-9) for f_id in fs_info.keys()})
+    reach = index.reachable(index.region_box(cell))
+    assert reach.sum() == model.num_trees
@@ -0,0 +1,47 @@
+import json
+
+from src.model import Model
+
+def test_tree_views():
+    with open("models/iris.json", "r") as f:
+        model_json = json.loads(f.read())
+    model = Model(model_json)
+    j_trees = model_json["learner"]["gradient_booster"]["model"]["trees"]
+    thresholds = {}
+    for tree, j_tree in zip(model.trees, j_trees):
+        assert len(tree) == len(j_tree["left_children"])
+        for node_id in range(len(tree)):
+            assert tree.left_child(node_id) == j_tree["left_children"][node_id]
+            assert tree.right_child(node_id) == j_tree["right_children"][node_id]
+            assert tree.parent(node_id) == j_tree["parents"][node_id]
+            assert tree.split_condition(node_id) == j_tree["split_conditions"][node_id]
+            assert tree.is_leaf(node_id) == (j_tree["left_children"][node_id] == -1)
+            if not tree.is_leaf(node_id):
+                assert tree.split_index(node_id) == j_tree["split_indices"][node_id]
+                thresholds.setdefault(tree.split_index(node_id), set()) \
+                    .add(tree.split_condition(node_id))
+    assert list(model.thresholds.keys()) == list(thresholds.keys())
+    assert model.thresholds == {f_id: sorted(ts) for f_id, ts in thresholds.items()}
+
+    assert model._stats is None
+    tree, j_tree = model.trees[3], j_trees[3]
+    assert abs(tree.sum_hessian(1) - j_tree["sum_hessian"][1]) < 1e-5
+    assert tree.stats[0][0] == model.loss_changes[model.node_starts[3]]
+
+def test_load_booster():
+    from xgboost import Booster
+    booster = Booster()
+    booster.load_model("models/iris.json")
+    model = Model.load("models/iris.json")
+    binary = Model.from_booster(booster)
+    assert binary.tree_info == model.tree_info
+    assert binary.thresholds == model.thresholds
+    for name in ("left", "right", "parent", "split_indices", "split_conditions", "default_left"):
+        assert (getattr(binary, name) == getattr(model, name)).all()
+
+def test_ubjson():
+    from src.utils import ubjson
+    doc = b"{i\x01a[$l#i\x02\x00\x00\x00\x01\xff\xff\xff\xfei\x01bSi\x02hi}"
+    value = ubjson.loads(doc)
+    assert value["a"].tolist() == [1, -2]
+    assert value["b"] == "hi"
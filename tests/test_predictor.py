@@ -0,0 +1,64 @@
+import numpy as np
+from xgboost import Booster, DMatrix
+
+from src.predictor import EnsemblePredictor
+from tests.helpers import load
+
+def test_iris_simple():
+    _verify_margins("iris_simple")
+
+def test_spambase():
+    _verify_margins("spambase")
+
+def test_single_instance():
+    model, _ = load("iris_simple")
+    predictor = EnsemblePredictor(model)
+    X = np.array([[5.0, 3.0, 1.5, 0.2], [6.5, 3.0, 5.5, 2.0]])
+    ws = predictor.margins(X)
+    assert np.allclose(predictor.margins(X[1]), ws[1])
+    assert predictor.predict(list(X[1])) == np.argmax(ws[1])
+
+def _verify_margins(name, n=500):
+    model, lims = load(name)
+    predictor = EnsemblePredictor(model)
+    rng = np.random.default_rng(0)
+    X = np.array([[rng.uniform(l, u) for (l, u) in lims.values()] for _ in range(n)])
+
+    booster = Booster()
+    booster.load_model(f"models/{name}.json")
+    xgb_ws = booster.predict(DMatrix(X), output_margin=True)
+    ws = predictor.margins(X)
+
+    if model.objective == "binary:logistic":
+        # base_score 0.5 is a zero margin under the logistic link
+        assert np.allclose(xgb_ws, ws[:, 0], atol=1e-5)
+        assert np.all(predictor.predict(X) == (xgb_ws >= 0))
+    else:
+        assert np.allclose(xgb_ws, ws + model.base_score, atol=1e-5)
+        assert np.all(predictor.predict(X) == np.argmax(xgb_ws, axis=1))
+
+def test_margin_bounds():
+    model, lims = load("iris")
+    predictor = EnsemblePredictor(model)
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        a = np.array([rng.uniform(l, u) for (l, u) in lims.values()])
+        b = np.array([rng.uniform(l, u) for (l, u) in lims.values()])
+        lower, upper = np.minimum(a, b), np.maximum(a, b)
+        lo, hi = predictor.margin_bounds(lower, upper)
+        X = rng.uniform(lower, upper, size=(200, len(lims)))
+        ws = predictor.margins(X)
+        assert np.all(ws >= lo - 1e-9) and np.all(ws <= hi + 1e-9)
+
+def test_leaf_box():
+    model, lims = load("wine")
+    predictor = EnsemblePredictor(model)
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        x = np.array([rng.uniform(l, u) for (l, u) in lims.values()])
+        lower, upper = predictor.leaf_box(x)
+        assert np.all(lower <= x) and np.all(x < upper)
+        lower = np.maximum(lower, [l for (l, _) in lims.values()])
+        upper = np.minimum(upper, [u for (_, u) in lims.values()])
+        X = rng.uniform(lower, upper, size=(100, len(lims)))
+        assert np.allclose(predictor.margins(X), predictor.margins(x))
@@ -0,0 +1,104 @@
+import random
+from math import log, isclose
+
+from pysat.examples.rc2 import RC2
+
+from src.regions import Region, FeatureSpaceInfo
+from src.generators.rc2_generator import SeedGenerator
+from src.generators.rc2stratified_generator import SeedGenerator as StratifiedGenerator
+from src.generators.incremental_generator import SeedGenerator as IncrementalGenerator
+
+def _score(r):
+    return sum(log(u - l) for l, u in r.bounds.values())
+
+def test_live_oracle_matches_fresh():
+    fs_info = FeatureSpaceInfo({0: [1.0, 2.0, 3.0, 4.0], 1: [0.5, 1.5, 2.5], 2: [4.0, 6.0]})
+    g = SeedGenerator(fs_info)
+    g.must_contain(Region({0: (2.0, 3.0), 1: (0.5, 1.5), 2: (4.0, 6.0)}))
+    rng = random.Random(0)
+    for it in range(20):
+        if it % 7 == 6:
+            # any totalizer sum rebuilds the oracle after this call
+            g.fresh_sums = 0
+        r = g.get_seed()
+        with RC2(g.wcnf, solver=g.solver, adapt=True, exhaust=True, minz=True) as fresh:
+            model = fresh.compute()
+        if model is None:
+            assert r is None
+            break
+        assert isclose(_score(r), _score(g._model_to_region(model)))
+        # block every seed containing a cell away from the instance
+        cell = {}
+        for f_id, d in fs_info.domains.items():
+            j = rng.randrange(len(d) - 1)
+            cell[f_id] = (d[j], d[j+1])
+        if cell[0] != (2.0, 3.0):
+            g.block_up(Region(cell))
+    assert g.n_rebuilds >= 1
+
+def test_stratified_expansion():
+    fs_info = FeatureSpaceInfo({0: [1.0, 2.0, 3.0, 4.0], 1: [0.5, 1.5, 2.5]})
+    g = StratifiedGenerator(fs_info)
+    g.must_contain(Region({0: (2.0, 3.0), 1: (0.5, 1.5)}))
+    l, u, I = g._get_index_functions()
+    top = g.vpool.top
+    prev = None
+    for it in range(15):
+        r = g.get_seed()
+        # at most one oracle rebuild per call
+        assert g.n_rebuilds <= it + 1
+        if r is None:
+            break
+        # seeds never widen and only use intervals active before the call
+        assert prev is None or _score(r) <= _score(prev) + 1e-9
+        for f_id, (j, k) in g._region_to_didx(r).items():
+            assert I(f_id, j, k) in g.active_softs[f_id]
+        g.block_up(r)
+        prev = r
+    assert g.vpool.top == top
+
+def test_order_encoding():
+    fs_info = FeatureSpaceInfo({0: [1.0, 2.0, 3.0, 4.0], 1: [0.5, 1.5, 2.5], 2: [4.0, 6.0]})
+    instance = Region({0: (2.0, 3.0), 1: (0.5, 1.5), 2: (4.0, 6.0)})
+    for generator in (SeedGenerator, StratifiedGenerator, IncrementalGenerator):
+        direct = generator(fs_info, encoding="direct")
+        order = generator(fs_info, encoding="order")
+        for g in (direct, order):
+            g.must_contain(instance)
+        for it in range(12):
+            r1, r2 = direct.get_seed(), order.get_seed()
+            if r1 is None:
+                assert r2 is None
+                break
+            assert isclose(_score(r1), _score(r2))
+            assert r2.contains(instance)
+            for g in (direct, order):
+                # alternate between both kinds of blocking clause
+                if it % 2 == 0 or r1 == Region({f: (d[0], d[-1]) for f, d in fs_info.domains.items()}):
+                    g.block_up(r1)
+                else:
+                    g.block_down(r1)
+
+def test_instance_specialised():
+    fs_info = FeatureSpaceInfo({0: [1.0, 2.0, 3.0, 4.0, 5.0], 1: [0.5, 1.5, 2.5], 2: [4.0, 6.0]})
+    instance = Region({0: (2.0, 3.0), 1: (0.5, 1.5), 2: (4.0, 6.0)})
+    for generator in (SeedGenerator, StratifiedGenerator, IncrementalGenerator):
+        for encoding in ("direct", "order"):
+            full = generator(fs_info, encoding=encoding)
+            full.must_contain(instance)
+            spec = generator(fs_info, encoding=encoding, instance=instance)
+            # domains are padded with the limits, so the instance is (2, 3)
+            assert "I_0_2_5" in spec.vpool.obj2id
+            assert "I_0_3_4" not in spec.vpool.obj2id
+            for it in range(12):
+                r1, r2 = full.get_seed(), spec.get_seed()
+                if r1 is None:
+                    assert r2 is None
+                    break
+                assert isclose(_score(r1), _score(r2))
+                assert r2.contains(instance)
+                for g in (full, spec):
+                    if it % 2 == 0 or r1 == Region({f: (d[0], d[-1]) for f, d in fs_info.domains.items()}):
+                        g.block_up(r1)
+                    else:
+                        g.block_down(r1)
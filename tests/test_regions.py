@@ -0,0 +1,27 @@
+from src.regions import Region, IndexRegion, FeatureSpaceInfo
+
+def _fs_info():
+    thresholds = {0: [1.0, 2.0, 3.0], 2: [0.5]}
+    return FeatureSpaceInfo(thresholds, limits={0: (0.0, 4.0), 2: (0.0, 1.0)})
+
+def test_index_region():
+    fs_info = _fs_info()
+    r = fs_info.index_region(Region({0: (1.0, 3.0)}))
+    assert r.index_bounds() == {0: (1, 3)}
+    assert r.bounds == {0: (1.0, 3.0)}
+    assert r.to_region() == Region({0: (1.0, 3.0)})
+    assert r == IndexRegion.from_region(fs_info, Region({0: (1.0, 3.0)}))
+    assert len({r, fs_info.index_region(Region({0: (1.0, 3.0)}))}) == 1
+
+def test_index_region_order():
+    fs_info = _fs_info()
+    free = fs_info.index_region(Region({}))
+    big = fs_info.index_region(Region({0: (0.0, 4.0), 2: (0.0, 1.0)}))
+    small = fs_info.index_region(Region({0: (1.0, 2.0), 2: (0.0, 0.5)}))
+    assert free.contains(big) and big.contains(small)
+    assert not small.contains(big)
+    assert small.contained_in(free)
+    assert big.blocked_up_by(small) and not small.blocked_up_by(big)
+    assert small.blocked_down_by(big) and not big.blocked_down_by(small)
+    assert fs_info.n_regions_contains(Region({0: (1.0, 2.0), 2: (0.0, 0.5)})) == \
+        (1+1) * (5-2+1) * (0+1) * (3-1+1)
@@ -0,0 +1,48 @@
+import random
+
+from src.regions import FeatureSpaceInfo
+from src.entailment.z3_entailer import EntailmentChecker as Z3EntailmentChecker
+from src.entailment.maxsat_entailer import EntailmentChecker as SatEntailmentChecker
+from tests.helpers import load, random_region
+
+def test_iris_simple():
+    _verify_against_z3("iris_simple")
+
+def _verify_against_z3(name, n=50):
+    model, lims = load(name)
+    fs_info = FeatureSpaceInfo(model.thresholds, lims)
+    z3_entailer = Z3EntailmentChecker(model, prefilter=False)
+    sat_entailer = SatEntailmentChecker(model)
+    n_solves = [0]
+    solve = sat_entailer.solver.solve
+    def counted_solve(*args, **kwargs):
+        n_solves[0] += 1
+        return solve(*args, **kwargs)
+    sat_entailer.solver.solve = counted_solve
+    rng = random.Random(0)
+    for _ in range(n):
+        r = random_region(fs_info, rng)
+        out = rng.choice(sat_entailer.groups)
+        entailed = sat_entailer.entails(r, out)
+        assert entailed == z3_entailer.entails(r, out)
+        if not entailed:
+            x = sat_entailer.cexample
+            assert sat_entailer.predict(x) != out
+            for f_id, (lower, upper) in r.bounds.items():
+                assert lower <= x[f_id] < upper
+    assert sat_entailer.oracle_calls == n_solves[0]
+
+def test_region_encoding():
+    model, lims = load("iris_simple")
+    fs_info = FeatureSpaceInfo(model.thresholds, lims)
+    kwargs = dict(prefilter=False, cache_size=0, pool=False)
+    full = Z3EntailmentChecker(model, **kwargs)
+    region = Z3EntailmentChecker(model, encoding="region", **kwargs)
+    rng = random.Random(1)
+    for _ in range(50):
+        r = random_region(fs_info, rng)
+        out = rng.choice(full.groups)
+        entailed = region.entails(r, out)
+        assert entailed == full.entails(r, out)
+        if not entailed:
+            assert region.predict(region.cexample) != out
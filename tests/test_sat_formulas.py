@@ -1,3 +1,8 @@
+from itertools import product
+
+from pysat.formula import IDPool
+from pysat.solvers import Solver
+
 from src.utils.sat_shortcuts import *
 
 def assert_equiv(A, B):
@@ -164,4 +169,31 @@ def test_advanced_Implies():
 def test_advanced_Iff():
     # Complex biconditionals with nested formulas (1 And 2 <-> 3 Or 4)
     formula = Iff(And([1, 2]), Or([3, 4]))
-    assert_equiv(formula.to_cnf(), [[-1, -2, 3, 4], [1, -3], [1, -4], [2, -3], [2, -4]])
\ No newline at end of file
+    assert_equiv(formula.to_cnf(), [[-1, -2, 3, 4], [1, -3], [1, -4], [2, -3], [2, -4]])
+
+
+def _models(cnf, n):
+    # assignments of variables 1..n that extend to a model of cnf
+    models = set()
+    with Solver(bootstrap_with=cnf) as s:
+        for bits in product([False, True], repeat=n):
+            assumptions = [i+1 if b else -(i+1) for i, b in enumerate(bits)]
+            if s.solve(assumptions=assumptions):
+                models.add(bits)
+    return models
+
+
+def test_tseitin_Or():
+    # 4^4 clauses when distributed, 16 + 1 with one variable per disjunct
+    formula = Or([And([4*i+1, 4*i+2, 4*i+3, 4*i+4]) for i in range(4)])
+    vpool = IDPool(start_from=17)
+    cnf = formula.to_cnf(vpool)
+    assert len(cnf) == 17
+    assert _models(cnf, 16) == _models(formula.to_cnf(), 16)
+    # small disjunctions still distribute
+    assert_equiv(Or([And([1, 2]), 3]).to_cnf(vpool), [[1, 3], [2, 3]])
+
+def test_EqualsOne():
+    exactly_one = {bits for bits in _models([], 4) if sum(bits) == 1}
+    assert _models(EqualsOne([1, 2, 3, 4]).to_cnf(), 4) == exactly_one
+    assert _models(EqualsOne([1, 2, 3, 4]).to_cnf(IDPool(start_from=5)), 4) == exactly_one
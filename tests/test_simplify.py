@@ -0,0 +1,42 @@
+import random
+
+from src.predictor import EnsemblePredictor
+from src.simplify import simplify_model
+from tests.helpers import load
+
+def test_simplify_keeps_predictions():
+    for name in ("iris", "wine"):
+        original, lims = load(name)
+        simplified, _ = load(name)
+        stats = simplify_model(simplified, lims)
+        assert stats["nodes"][1] <= stats["nodes"][0]
+        assert stats["trees"][1] < stats["trees"][0]
+        assert simplified.num_trees == len(simplified.tree_info)
+
+        rng = random.Random(0)
+        X = [
+            [rng.uniform(*lims[f_id]) for f_id in range(original.num_feature)]
+            for _ in range(500)
+        ]
+        X += [[lims[f_id][i % 2] for f_id in range(original.num_feature)] for i in range(2)]
+        p, q = EnsemblePredictor(original), EnsemblePredictor(simplified)
+        assert abs(p.margins(X) - q.margins(X)).max() < 1e-9
+        assert (p.predict(X) == q.predict(X)).all()
+
+def test_prune_unreachable():
+    model, _ = load("iris")
+    # a domain limit on a single threshold cell decides every split on it
+    f_id = 2
+    ts = model.thresholds[f_id]
+    lims = {f_id: (ts[0], ts[0])}
+    simplify_model(model, lims)
+    assert f_id not in model.thresholds
+
+def test_step_tree_exact():
+    from src.simplify import _step_tree
+    stats = [0.0, 0.0, 0.0]
+    stump = lambda val, wl, wr: ("split", 0, val, True, stats, ("leaf", wl, stats), ("leaf", wr, stats))
+    # 0.1 + 0.2 rounds, which would move a margin tied at 0.3
+    assert _step_tree(0, True, [stump(1.0, 0.1, 0.5), stump(2.0, 0.2, 0.5)]) is None
+    step = _step_tree(0, True, [stump(1.0, 0.25, 0.5), stump(2.0, 0.125, 0.5)])
+    assert step[0] == "split" and step[2] == 2.0
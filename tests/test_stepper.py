@@ -1,5 +1,5 @@
 from src.traverser import LatticeTraverser
-from src.regions import Region
+from src.regions import Region, FeatureSpaceInfo
 
 def test():
     N = 5
@@ -13,6 +13,37 @@ def test():
                     return True
             return False
     
-    stepper = LatticeTraverser(TempEntailer(), thresholds)
+    stepper = LatticeTraverser(TempEntailer(), FeatureSpaceInfo(thresholds))
     stepper.shrink(r, "1")
-    
\ No newline at end of file
+    
+def test_relax_to_core():
+    N = 5
+    fs_info = FeatureSpaceInfo({i: list(range(1, 9)) for i in range(N)}, {i: (0, 9) for i in range(N)})
+    r = Region({i: (3, 5) for i in range(N)})
+
+    stepper = LatticeTraverser(None, fs_info)
+    stepper.relax_to_core(r, {(0, 0), (2, 1)})
+    assert r.bounds[0] == (3, 9)
+    assert r.bounds[2] == (0, 5)
+    assert r.bounds[1] == (0, 9)
+
+def test_grow_with_core():
+    N = 5
+    fs_info = FeatureSpaceInfo({i: list(range(1, 9)) for i in range(N)}, {i: (0, 9) for i in range(N)})
+
+    class TempEntailer:
+        calls = 0
+        def entails(self, r, c):
+            self.calls += 1
+            return r.bounds[0][0] >= 3 and r.bounds[2][1] <= 5
+
+    grown = []
+    for core in (None, {(0, 0), (2, 1)}):
+        entailer = TempEntailer()
+        stepper = LatticeTraverser(entailer, fs_info)
+        r = Region({i: (3, 5) for i in range(N)})
+        stepper.grow(r, "1", core)
+        grown.append((r.bounds, entailer.calls))
+    (plain, plain_calls), (cored, cored_calls) = grown
+    assert plain == cored == {0: (3, 9), 1: (0, 9), 2: (0, 5), 3: (0, 9), 4: (0, 9)}
+    assert cored_calls < plain_calls
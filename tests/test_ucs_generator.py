@@ -0,0 +1,65 @@
+from math import log
+
+import pytest
+
+from benchmark.benchmark import get_lims
+from src.model import Model
+from src.explainer import ExplanationProgram
+
+from src.regions import Region, FeatureSpaceInfo
+from src.generators.ucs_generator import SeedGenerator
+
+def _score(r):
+    return sum(log(u - l) for l, u in r.bounds.values())
+
+def test_enumerates_in_order():
+    fs_info = FeatureSpaceInfo({0: [1.0, 2.0, 3.0], 1: [0.5, 1.5], 2: [4.0, 6.0]})
+    g = SeedGenerator(fs_info)
+    seeds = []
+    r = g.get_seed()
+    while r is not None:
+        seeds.append(r)
+        r = g.get_seed()
+    # every region exactly once, widest first
+    assert len(seeds) == fs_info.n_regions()
+    assert len({repr(r) for r in seeds}) == len(seeds)
+    scores = [_score(r) for r in seeds]
+    assert all(a >= b - 1e-9 for a, b in zip(scores, scores[1:]))
+
+def test_max_frontier():
+    fs_info = FeatureSpaceInfo({f: [float(i) for i in range(6)] for f in range(4)})
+    g = SeedGenerator(fs_info, max_frontier=20)
+    for _ in range(50):
+        assert g.get_seed() is not None
+        assert len(g.frontier) <= 20
+    assert g.truncated
+
+def test_instance():
+    fs_info = FeatureSpaceInfo({0: [1.0, 2.0, 3.0, 4.0], 1: [0.5, 1.5, 2.5], 2: [4.0, 6.0]})
+    instance = Region({0: (2.0, 3.0), 1: (1.5, 2.5)})
+    full = SeedGenerator(fs_info)
+    full.must_contain(instance)
+    spec = SeedGenerator(fs_info, instance=instance)
+    assert [len(spec.pairs[f_id]) for f_id in range(3)] == [9, 6, 6]
+    seeds = {}
+    for g in (full, spec):
+        seeds[g] = []
+        r = g.get_seed()
+        while r is not None:
+            seeds[g].append(r)
+            r = g.get_seed()
+    # the same seeds, up to the order of ties
+    assert [_score(r) for r in seeds[full]] == [_score(r) for r in seeds[spec]]
+    assert {repr(r) for r in seeds[full]} == {repr(r) for r in seeds[spec]}
+
+def test_truncated_search_incomplete():
+    lims = get_lims("models/iris.lims")
+    model = Model.load("models/iris.json")
+    x = [(l + u) / 2 for l, u in lims.values()]
+    program = ExplanationProgram(model, limits=lims, seed_gen="ucs", max_frontier=4)
+    for _ in program.enumerate_explanations(x):
+        pass
+    assert program.generator.truncated
+    assert not program.search_complete
+    with pytest.raises(ValueError):
+        ExplanationProgram(model, limits=lims, seed_gen="maxsat", max_frontier=4)
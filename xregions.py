@@ -1,4 +1,3 @@
-import json
 import sys
 import time
 import argparse
@@ -7,7 +6,8 @@ import random
 
 from src.model import Model
 from src.explainer import ExplanationProgram
-from benchmark.benchmark import benchmark_all
+from src.compiled import compile_model
+from benchmark.benchmark import benchmark_all, get_model_path
 
 logging.basicConfig(
     stream=sys.stdout,
@@ -58,6 +58,16 @@ def main():
                         default=False,
                         required=False,
                         help="Whether or not to block score when enumerating.")
+    parser.add_argument("--simplify",
+                        action="store_true",
+                        required=False,
+                        help="Prune the model to the domain limits first, also when benchmarking. "
+                             "Predictions outside the limits may change.")
+    parser.add_argument("--cache",
+                        action="store_true",
+                        required=False,
+                        help="Load and save the compiled model next to the model "
+                             "file. The file is unpickled, so it must be trusted.")
     parser.add_argument("--seed-gen",
                         type=str,
                         default="rand",
@@ -66,13 +76,13 @@ def main():
     args = parser.parse_args()
 
     if args.benchmark_all:
-        benchmark_all(args.seed_gen)
+        benchmark_all(args.seed_gen, simplify=args.simplify)
         return
     if args.benchmark_explain:
-        benchmark_explain(args.model)
+        benchmark_explain(args.model, simplify=args.simplify)
         return
     if args.benchmark_enumerate:
-        benchmark_enumerate(args.model)
+        benchmark_enumerate(args.model, simplify=args.simplify)
         return
 
     if args.loglevel:
@@ -81,15 +91,17 @@ def main():
             raise ValueError("Invalid log level: %s" % args.loglevel)
         logging.getLogger().setLevel(numeric_level)
 
-    with open(f"models/{args.model}.json", "r") as fd:
-        model = json.load(fd)
-    model = Model(model)
-    logging.info(f"successfully initialised models/{args.model}.json")
-    
     lims = get_lims(f"models/{args.model}.lims")
-    logging.info(f"successfully initialised domain limits models/{args.model}.json")
-    
+    logging.info(f"successfully initialised domain limits models/{args.model}.lims")
+
     seed_gen = args.seed_gen
+    compiled = compile_model(
+        get_model_path(args.model), lims, seed_gens=(seed_gen,),
+        simplify=args.simplify, cache=args.cache
+    )
+    model = compiled.model
+    logging.info(f"successfully initialised model {args.model}")
+
     block_score = args.block_score
 
     instance = args.explain if args.explain is not None else args.enumerate
@@ -99,7 +111,7 @@ def main():
     else:
         instance = [float(x) for x in instance.split(",")]
 
-    program = ExplanationProgram(model, limits=lims, seed_gen=seed_gen, mpath=f"models/{args.model}.json")
+    program = ExplanationProgram(model, limits=lims, seed_gen=seed_gen, compiled=compiled)
     logging.info(
         "\nPROGRAM INFO:\n" + \
             f"\tObjective: {model.objective}\n"